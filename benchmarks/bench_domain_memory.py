@@ -0,0 +1,59 @@
+"""
+Memory taken per Book, with every field the JSON reader fills in, for freshly built books and for books read back
+from a pickle the way a memory repository snapshot is. Titles and descriptions are counted with the book.
+
+Run from the project root:
+    python -m benchmarks.bench_domain_memory [number of books]
+"""
+import gc
+import pickle
+import sys
+import tracemalloc
+
+from library.domain.model import Author, Book, Publisher
+
+DEFAULT_BOOKS = 1000000
+
+
+def make_books(count: int, publisher: Publisher, author: Author):
+    books = []
+    for book_id in range(count):
+        book = Book(book_id, 'Title %d' % book_id)
+        book.description = 'Description %d' % book_id
+        book.ebook = book_id % 2 == 0
+        book.img_url = 'https://images.example.com/%d.jpg' % book_id
+        book.website_url = 'https://www.example.com/book/show/%d' % book_id
+        book.num_pages = 100 + book_id % 400
+        book.release_year = 1950 + book_id % 70
+        book.publisher = publisher
+        book.add_author(author)
+        book.ratings_count = book_id % 1000
+        book.average_rating = 4.0
+        book.text_reviews_count = book_id % 100
+        books.append(book)
+    return books
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main(count: int):
+    publisher = Publisher('Publisher')
+    author = Author(1, 'Author')
+    books, size = measure(lambda: make_books(count, publisher, author))
+    print('%-10s %8.1f bytes/book' % ('built', size / count))
+
+    snapshot = pickle.dumps(books, protocol=pickle.HIGHEST_PROTOCOL)
+    del books
+    books, size = measure(lambda: pickle.loads(snapshot))
+    print('%-10s %8.1f bytes/book' % ('unpickled', size / count))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BOOKS)
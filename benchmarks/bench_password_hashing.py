@@ -0,0 +1,27 @@
+"""
+Time taken to hash the passwords of users.csv with 1 up to one worker process per core.
+
+Run from the project root:
+    python -m benchmarks.bench_password_hashing [data path]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+from library.adapters.data_importer import hash_passwords, read_csv_file
+from utils import get_project_root
+
+DEFAULT_DATA_PATH = get_project_root() / 'library' / 'adapters' / 'data'
+
+
+def main(data_path: Path):
+    passwords = [data_row[2] for data_row in read_csv_file(str(data_path / 'users.csv'))]
+    for workers in range(1, (os.cpu_count() or 1) + 1):
+        start = time.perf_counter()
+        hash_passwords(passwords, workers)
+        print('%2d workers %8.2f s for %d passwords' % (workers, time.perf_counter() - start, len(passwords)))
+
+
+if __name__ == '__main__':
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DATA_PATH)
@@ -0,0 +1,45 @@
+"""
+Time taken to populate a fresh SQLite database, one object at a time and in bulk.
+
+Run from the project root:
+    python -m benchmarks.bench_populate [data path]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from library.adapters import repository_populate
+from library.adapters.database_repository import SqlAlchemyRepository
+from library.adapters.orm import metadata, map_model_to_tables
+from library.domain.model import ReadingList
+from utils import get_project_root
+
+DEFAULT_DATA_PATH = get_project_root() / 'library' / 'adapters' / 'data'
+
+
+def bench(data_path: Path, bulk_mode: bool) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        clear_mappers()
+        ReadingList._NEXT_ID = 1
+        engine = create_engine('sqlite:///%s/library.db' % directory)
+        metadata.create_all(engine)
+        map_model_to_tables()
+        repo = SqlAlchemyRepository(sessionmaker(bind=engine))
+        start = time.perf_counter()
+        repository_populate.populate(data_path, repo, True, bulk_mode)
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    return elapsed
+
+
+def main(data_path: Path):
+    for bulk_mode in (False, True):
+        print('%-12s %8.2f s' % ('bulk' if bulk_mode else 'per object', bench(data_path, bulk_mode)))
+
+
+if __name__ == '__main__':
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DATA_PATH)
@@ -0,0 +1,79 @@
+"""
+Per-request database session overhead: rebuilding a scoped_session registry before every request and closing it at
+teardown, against one registry scoped to the app context with remove() at teardown. Each simulated request runs
+one primary key lookup, about what the home page and other light pages cost, and the same is timed through a
+full request of the home page with the current app.
+
+Run from the project root:
+    python -m benchmarks.bench_request_session [requests]
+"""
+import sys
+import tempfile
+import time
+
+from flask import Flask, _app_ctx_stack
+from sqlalchemy import text
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from library import create_app
+from library.adapters.database_engine import create_database_engine
+from library.adapters.database_repository import SessionContextManager
+from utils import get_project_root
+
+DEFAULT_REQUESTS = 20000
+
+
+def rebuilt_registry(app: Flask, session_factory, requests: int) -> float:
+    # the lifecycle before: a new registry in before_request, close() at teardown
+    session = scoped_session(session_factory, scopefunc=_app_ctx_stack.__ident_func__)
+    start = time.perf_counter()
+    for _ in range(requests):
+        with app.app_context():
+            session.close()
+            session = scoped_session(session_factory, scopefunc=_app_ctx_stack.__ident_func__)
+            session.execute(text('SELECT 1'))
+            session.close()
+    return time.perf_counter() - start
+
+
+def long_lived_registry(app: Flask, session_factory, requests: int) -> float:
+    session_cm = SessionContextManager(session_factory)
+    start = time.perf_counter()
+    for _ in range(requests):
+        with app.app_context():
+            session_cm.session.execute(text('SELECT 1'))
+            session_cm.close_current_session()
+    return time.perf_counter() - start
+
+
+def home_page(requests: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'TESTING': 'True',
+            'TEST_DATA_PATH': get_project_root() / 'tests' / 'data',
+            'REPOSITORY': 'database',
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s/library.db' % directory,
+        })
+        client = app.test_client()
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get('/')
+        return time.perf_counter() - start
+
+
+def main(requests: int):
+    app = Flask(__name__)
+    with tempfile.TemporaryDirectory() as directory:
+        for pool in ('null', 'queue'):
+            engine = create_database_engine('sqlite:///%s/library.db' % directory, pool=pool)
+            session_factory = sessionmaker(bind=engine)
+            for name, bench in (('rebuilt registry', rebuilt_registry), ('long-lived registry', long_lived_registry)):
+                elapsed = bench(app, session_factory, requests)
+                print('%-6s %-20s %8.1f us/request' % (pool, name, elapsed / requests * 1e6))
+            engine.dispose()
+    page_requests = max(requests // 20, 1)
+    print('%-27s %8.1f us/request' % ('home page', home_page(page_requests) / page_requests * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REQUESTS)
@@ -0,0 +1,71 @@
+"""
+Title search latency on a catalog made of the bundled comic book excerpt repeated many times.
+
+Compares the in-memory n-gram index with the linear scan it replaced, and the SQLite FTS5 trigram index with LIKE.
+Run from the project root:
+    python -m benchmarks.bench_title_search [scale]
+"""
+import json
+import sys
+import timeit
+
+from sqlalchemy import create_engine, text
+
+from library.adapters.orm import metadata, books_table
+from library.adapters.title_index import TitleIndex
+from utils import get_project_root
+
+BOOKS_FILE = get_project_root() / 'library' / 'adapters' / 'data' / 'comic_books_excerpt.json'
+QUERIES = ('seiyuu', 'century boys', 'vol. 1', 'the', 'no such title')
+DEFAULT_SCALE = 100
+
+
+def load_titles(scale: int):
+    with open(BOOKS_FILE) as book_file:
+        titles = [json.loads(line)['title'] for line in book_file]
+    return [(copy * len(titles) + i + 1, '%s (copy %d)' % (title, copy))
+            for copy in range(scale) for i, title in enumerate(titles)]
+
+
+def mean_ms(fn, number=200):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1000
+
+
+def bench_memory(titles):
+    index = TitleIndex()
+    for book_id, title in titles:
+        index.add(book_id, title)
+    print('%-16s %12s %12s %8s' % ('memory', 'scan ms', 'index ms', 'hits'))
+    for query in QUERIES:
+        scan = mean_ms(lambda: [i for i, t in titles if query.lower() in t.lower()])
+        indexed = mean_ms(lambda: index.search(query))
+        print('%-16s %12.4f %12.4f %8d' % (query, scan, indexed, len(index.search(query))))
+
+
+def bench_sqlite(titles):
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(books_table.insert(), [dict(
+            id=book_id, title=title, website_url='', ebook=False, num_pages=0, image_url='', description='',
+            release_year=0, average_rating=0, rating_count=0, text_reviews_count=0) for book_id, title in titles])
+    connection = engine.connect()
+    like = text("SELECT id FROM book WHERE title LIKE :pattern")
+    match = text("SELECT rowid FROM book_title_fts WHERE book_title_fts MATCH :phrase ORDER BY rowid")
+    print('%-16s %12s %12s %8s' % ('sqlite', 'LIKE ms', 'FTS5 ms', 'hits'))
+    for query in QUERIES:
+        scan = mean_ms(lambda: connection.execute(like, {'pattern': '%%%s%%' % query}).fetchall())
+        indexed = mean_ms(lambda: connection.execute(match, {'phrase': '"%s"' % query}).fetchall())
+        hits = len(connection.execute(match, {'phrase': '"%s"' % query}).fetchall())
+        print('%-16s %12.4f %12.4f %8d' % (query, scan, indexed, hits))
+
+
+def main(scale: int):
+    titles = load_titles(scale)
+    print('%d books' % len(titles))
+    bench_memory(titles)
+    bench_sqlite(titles)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SCALE)
@@ -0,0 +1,46 @@
+"""
+Per-request cost of MemoryRepository.get_user as the number of accounts grows.
+
+Run from the project root:
+    python -m benchmarks.bench_user_lookup [sizes...]
+"""
+import sys
+import timeit
+
+from library.adapters.memory_repository import MemoryRepository
+from library.domain.model import User, Shelve
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+LOOKUPS = 100_000
+
+
+def build_repo(number_of_users: int) -> MemoryRepository:
+    repo = MemoryRepository()
+    for i in range(number_of_users):
+        # an empty shelve keeps set-up cheap, get_user never touches it
+        repo.add_user(User('user%d' % i, 'password', shelve=Shelve()))
+    return repo
+
+
+def bench(number_of_users: int) -> float:
+    """:return: mean seconds per get_user call"""
+    repo = build_repo(number_of_users)
+    # mixed case on purpose, lookups have to normalise the name like the login form does
+    names = ['User%d' % (i * 7919 % number_of_users) for i in range(1000)]
+
+    def lookup():
+        for name in names:
+            repo.get_user(name)
+
+    total = min(timeit.repeat(lookup, number=LOOKUPS // len(names), repeat=5))
+    return total / LOOKUPS
+
+
+def main(sizes):
+    print('%12s %16s' % ('users', 'ns / get_user'))
+    for size in sizes:
+        print('%12d %16.1f' % (size, bench(size) * 1e9))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
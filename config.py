@@ -12,9 +12,30 @@ class Config:
     TESTING = environ.get('TESTING')
 
     REPOSITORY = environ.get('REPOSITORY')
+    # memory repository saved after it is populated and read back on the next start, unless the data changed
+    MEMORY_SNAPSHOT_PATH = environ.get('MEMORY_SNAPSHOT_PATH')
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
 
+    # null opens a connection for every request, queue and singleton keep them open (see database_engine.py)
+    SQLALCHEMY_POOL = environ.get('SQLALCHEMY_POOL', 'null').lower().strip()
+    SQLALCHEMY_POOL_SIZE = int(environ.get('SQLALCHEMY_POOL_SIZE', 5))
+
     echo_string = environ.get('SQLALCHEMY_ECHO')
     SQLALCHEMY_ECHO = False
     if echo_string.lower().strip() == "true":
         SQLALCHEMY_ECHO = True
+
+    # parts of the book pages that are the same for everyone: memory keeps them in each process, shared in the SQLite
+    # file PAGE_CACHE_PATH used by all the processes of the machine, off renders them on every request. The versions
+    # of the pages kept with them are their ETags, off sends none. Unset, it is shared for the database repository,
+    # whose changes made by one process have to reach the pages of the others, and memory otherwise
+    PAGE_CACHE = environ.get('PAGE_CACHE', '').lower().strip()
+    PAGE_CACHE_PATH = environ.get('PAGE_CACHE_PATH', 'library-pages.cache')
+    PAGE_CACHE_SIZE = int(environ.get('PAGE_CACHE_SIZE', 256))
+
+    # processes parsing the json dumps when the repository is populated, 1 parses them in the app process
+    PARSE_WORKERS = int(environ.get('PARSE_WORKERS', 1))
+
+    # Load the data files with one batched insert per table when the database is (re)populated
+    bulk_string = environ.get('BULK_POPULATE', 'true')
+    BULK_POPULATE = bulk_string.lower().strip() == "true"
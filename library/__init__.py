@@ -3,18 +3,21 @@ from pathlib import Path
 
 import flask_bootstrap
 from flask import Flask
-from sqlalchemy import create_engine, func
+from sqlalchemy import func
 from sqlalchemy.orm import sessionmaker, clear_mappers
-from sqlalchemy.pool import NullPool
 
 import library.adapters.repository as repo
 import library.adapters.repository_populate
 from library.adapters import memory_repository, database_repository
+from library.adapters.database_engine import create_database_engine
 from library.adapters.database_repository import SqlAlchemyRepository
 
 from library.adapters.memory_repository import MemoryRepository
-from library.adapters.orm import map_model_to_tables, metadata
+from library.adapters.orm import map_model_to_tables, metadata, create_missing_indexes
 from library.adapters.repository_populate import populate
+from library.adapters.repository_snapshot import populate_from_snapshot, source_fingerprint
+from library.books.services import set_page_store
+from library.cache import MemoryStore, SqliteStore
 from library.domain.model import ReadingList
 
 
@@ -30,15 +33,29 @@ def create_app(test_config=None):
         app.config.from_mapping(test_config)
         data_path = app.config['TEST_DATA_PATH']
 
+    # set when the data of the repository may differ from the one the pages in a shared page cache were rendered from
+    repopulated = False
+    # generation of the page tags, the same in the workers populated from the same data, see library.cache.MemoryStore
+    page_generation = None
+
     # Here the "magic" of our repository pattern happens. We can easily switch between in memory data and
     # persistent database data storage for our application.
 
     if app.config['REPOSITORY'] == 'memory':
+        page_generation = source_fingerprint(data_path)[:12]
         # Create the MemoryRepository implementation for a memory-based repository.
-        repo.repo_instance = memory_repository.MemoryRepository()
-        # fill the content of the repository from the provided csv files (has to be done every time we start app!)
-        database_mode = False
-        library.adapters.repository_populate.populate(data_path, repo.repo_instance, database_mode)
+        snapshot_path = app.config.get('MEMORY_SNAPSHOT_PATH')
+        # tests always load their own data from scratch
+        if snapshot_path and app.config['TESTING'] not in (True, 'True'):
+            # read back the repository saved by an earlier start, populated and saved again if the data changed
+            repo.repo_instance = populate_from_snapshot(data_path, Path(snapshot_path),
+                                                        parse_workers=app.config.get('PARSE_WORKERS', 1))
+        else:
+            repo.repo_instance = memory_repository.MemoryRepository()
+            # fill the content of the repository from the provided csv files (has to be done every time we start app!)
+            database_mode = False
+            library.adapters.repository_populate.populate(data_path, repo.repo_instance, database_mode,
+                                                          parse_workers=app.config.get('PARSE_WORKERS', 1))
 
     elif app.config['REPOSITORY'] == 'database':
         # Configure database.
@@ -49,9 +66,11 @@ def create_app(test_config=None):
         # leading to a URI of "sqlite:///covid-19.db".
         # Note that create_engine does not establish any actual DB connection directly!
         database_echo = app.config['SQLALCHEMY_ECHO']
-        # Please do not change the settings for connect_args and poolclass!
-        database_engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=NullPool,
-                                        echo=database_echo)
+        # Connections are shared between the request threads, opened with WAL and the other pragmas of
+        # database_engine.SQLITE_CONNECT_PRAGMAS, unless SQLALCHEMY_POOL is null
+        database_engine = create_database_engine(database_uri, pool=app.config.get('SQLALCHEMY_POOL', 'null'),
+                                                 pool_size=app.config.get('SQLALCHEMY_POOL_SIZE', 5),
+                                                 echo=database_echo)
 
         # Create the database session factory using sessionmaker (this has to be done once, in a global manner)
         session_factory = sessionmaker(autocommit=False, autoflush=True, bind=database_engine)
@@ -70,12 +89,17 @@ def create_app(test_config=None):
             map_model_to_tables()
 
             database_mode = True
-            library.adapters.repository_populate.populate(data_path, repo.repo_instance, database_mode)
+            repopulated = True
+            library.adapters.repository_populate.populate(data_path, repo.repo_instance, database_mode,
+                                                          bulk_mode=app.config.get('BULK_POPULATE', False),
+                                                          parse_workers=app.config.get('PARSE_WORKERS', 1))
             print("REPOPULATING DATABASE... FINISHED")
 
         else:
             # Solely generate mappings that map domain model classes to the database tables.
             map_model_to_tables()
+        # databases created before an index was added to their tables get it now
+        create_missing_indexes(database_engine)
 
         # init uid value of ReadingList
         # print(metadata.tables)
@@ -83,6 +107,24 @@ def create_app(test_config=None):
         max_uid = repo.repo_instance._session_cm.session.query(func.max(table.c.id)).one()[0]
         # print(max_uid)
         ReadingList._NEXT_ID = max_uid+1
+        # give back the connection held by the session used to set up the repository
+        repo.repo_instance.close_session()
+
+    # Book pages are rendered once per version of the book, and pages are tagged with their versions for conditional
+    # GETs, see books.services.get_page_cache
+    page_cache = app.config.get('PAGE_CACHE') or ('shared' if app.config['REPOSITORY'] == 'database' else 'memory')
+    page_cache_size = app.config.get('PAGE_CACHE_SIZE', 256)
+    if page_cache == 'shared':
+        page_store = SqliteStore(app.config.get('PAGE_CACHE_PATH', 'library-pages.cache'), page_cache_size)
+        # pages left by an earlier start may show data that has been repopulated since, the workers starting on the
+        # same data keep the pages and the tags of each other
+        if repopulated or page_generation not in (None, page_store.generation()):
+            page_store.clear(page_generation)
+    elif page_cache == 'off':
+        page_store = None
+    else:
+        page_store = MemoryStore(page_cache_size, page_generation)
+    set_page_store(repo.repo_instance, page_store)
 
     # Build the application - these steps require an application context.
     with app.app_context():
@@ -96,13 +138,8 @@ def create_app(test_config=None):
         from .user import user
         app.register_blueprint(user.user_blueprint)
 
-        # Register a callback the makes sure that database sessions are associated with http requests
-        # We reset the session inside the database repository before a new flask request is generated
-        @app.before_request
-        def before_flask_http_request_function():
-            if isinstance(repo.repo_instance, database_repository.SqlAlchemyRepository):
-                repo.repo_instance.reset_session()
-
+        # Database sessions are scoped to the app context of each http request (see SessionContextManager), so
+        # a request starts with a fresh session without rebuilding anything; it only has to be removed afterwards.
         # Register a tear-down method that will be called after each request has been processed.
         @app.teardown_appcontext
         def shutdown_session(exception=None):
@@ -1,20 +1,27 @@
 import csv
 import datetime
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterable, List, Optional
 
+from sqlalchemy import Table
+from sqlalchemy.orm import class_mapper
 from werkzeug.security import generate_password_hash
 
+from library.adapters import orm
+from library.adapters.database_repository import SqlAlchemyRepository
 from library.adapters.jsondatareader import BooksJSONReader
+from library.adapters.memory_repository import MemoryRepository
 from library.adapters.repository import AbstractRepository
-from library.domain.model import Shelve, ReadingList, User, Review
+from library.domain.model import Shelve, ReadingList, BundledReadingList, User, Review
 
 
-def load_books_and_authors(data_path: Path, repo: AbstractRepository, database_mode: bool):
+def load_books_and_authors(data_path: Path, repo: AbstractRepository, database_mode: bool, parse_workers: int = 1):
     authors_filename = 'book_authors_excerpt.json'
     books_filename = 'comic_books_excerpt.json'
-    reader = BooksJSONReader(data_path / books_filename, data_path / authors_filename)
+    reader = BooksJSONReader(data_path / books_filename, data_path / authors_filename, workers=parse_workers)
     reader.read_json_files()
 
     for publisher in reader.dataset_of_publishers:
@@ -25,6 +32,7 @@ def load_books_and_authors(data_path: Path, repo: AbstractRepository, database_m
 
     for book in reader.dataset_of_books:
         repo.add_book(book)
+    return reader
 
 
 def read_csv_file(filename: str, delimiter=','):
@@ -81,15 +89,44 @@ def load_shelves(data_path: Path, repo: AbstractRepository, users: Dict[int, Use
     return shelve_dict
 
 
-def load_users(data_path: Path, repo: AbstractRepository, database_mode: bool):
+# users.csv rows with 'true' in this optional column hold a password hash, made by generate_password_hash, instead of
+# the password itself
+PASSWORD_HASHED_COLUMN = 5
+# below this many passwords, starting worker processes costs more than it saves
+PARALLEL_HASH_MIN_PASSWORDS = 8
+
+
+def hash_passwords(passwords: List[str], workers: Optional[int] = None) -> List[str]:
+    """
+    generate_password_hash for every password, spread over a pool of worker processes when there are enough of them.
+    :param passwords: passwords to hash
+    :param workers: number of processes, one per core by default
+    :return: the hashes, in the order of passwords
+    """
+    workers = min(workers or os.cpu_count() or 1, len(passwords))
+    if workers < 2 or len(passwords) < PARALLEL_HASH_MIN_PASSWORDS:
+        return [generate_password_hash(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(generate_password_hash, passwords, chunksize=max(len(passwords) // (workers * 4), 1)))
+
+
+def is_password_hashed(data_row: List[str]) -> bool:
+    return len(data_row) > PASSWORD_HASHED_COLUMN and data_row[PASSWORD_HASHED_COLUMN].lower() == 'true'
+
+
+def load_users(data_path: Path, repo: AbstractRepository, database_mode: bool, workers: Optional[int] = None):
     users = dict()
     users_filename = str(data_path / "users.csv")
-    for data_row in read_csv_file(users_filename):
+    data_rows = list(read_csv_file(users_filename))
+    # the expensive part of loading users, done for all of them at once
+    hashes = iter(hash_passwords([data_row[2] for data_row in data_rows if not is_password_hashed(data_row)],
+                                 workers))
+    for data_row in data_rows:
         book_ids = [int(id) for id in str.strip(data_row[4]).split(' ')]
         books = repo.get_books_by_id(book_ids)
         user = User(
             user_name=data_row[1],
-            password=generate_password_hash(data_row[2]),
+            password=data_row[2] if is_password_hashed(data_row) else next(hashes),
             pages_read=int(data_row[3]),
         )
         for book in books:
@@ -112,6 +149,118 @@ def load_reviews(data_path: Path, repo: AbstractRepository, database_mode: bool)
         user.add_review(review)
         repo.add_review(review, user)
 
+
+def bulk_load(data_path: Path, repo: SqlAlchemyRepository, relax_durability: bool = True, parse_workers: int = 1):
+    """
+    Load the data files into a database repository with one batched insert per table, instead of one commit
+    per object. The object graph is first built by the regular loaders against a throwaway MemoryRepository.
+    """
+    staging_repo = MemoryRepository()
+    reader = load_books_and_authors(data_path, staging_repo, False, parse_workers)
+    users = load_users(data_path, staging_repo, False)
+    load_shelves(data_path, staging_repo, users, False)
+    load_reviews(data_path, staging_repo, False)
+
+    rows = table_rows(reader.dataset_of_publishers, reader.dataset_of_authors, reader.dataset_of_books,
+                      users.values(), staging_repo.get_reviews())
+    repo.bulk_insert(rows, relax_durability)
+
+
+def table_rows(publishers: Iterable, authors: Iterable, books: Iterable, users: Iterable[User],
+               reviews: Iterable[Review]) -> Dict[Table, List[dict]]:
+    """
+    Rows of every table for the given object graph, in dependency order. Surrogate keys are numbered in the
+    order the objects would have been added one at a time, so both population paths produce the same database.
+    """
+    rows: Dict[Table, List[dict]] = {table: [] for table in (
+        orm.publishers_table, orm.authors_table, orm.books_table, orm.book_authors_table, orm.users_table,
+        orm.user_books_read_table, orm.shelves_table, orm.reading_lists_table, orm.reading_list_entry_table,
+        orm.bundled_reading_list_info, orm.reviews_table)}
+
+    publisher_ids = dict()
+    for publisher in publishers:
+        publisher_ids[publisher] = len(publisher_ids) + 1
+        rows[orm.publishers_table].append({'id': publisher_ids[publisher], 'name': publisher.name})
+
+    for author in authors:
+        rows[orm.authors_table].append({
+            'id': author.unique_id,
+            'full_name': author.full_name,
+            'average_rating': author.average_rating,
+            'rating_count': author.ratings_count,
+            'text_reviews_count': author.text_reviews_count,
+        })
+
+    for book in books:
+        rows[orm.books_table].append({
+            'id': book.book_id,
+            'website_url': book.website_url,
+            'ebook': book.ebook,
+            'num_pages': book.num_pages,
+            'title': book.title,
+            'publisher_id': publisher_ids.get(book.publisher),
+            'image_url': book.img_url,
+            'description': book.description,
+            'release_year': book.release_year,
+            'average_rating': book.average_rating,
+            'rating_count': book.ratings_count,
+            'text_reviews_count': book.text_reviews_count,
+        })
+        for author in book.authors:
+            rows[orm.book_authors_table].append({'book_id': book.book_id, 'author_id': author.unique_id})
+
+    user_ids = dict()
+    for user in users:
+        user_ids[user] = len(user_ids) + 1
+        rows[orm.users_table].append({
+            'id': user_ids[user],
+            'user_name': user.user_name,
+            'password': user.password,
+            'pages_read': user.pages_read,
+        })
+        for book in user.read_books:
+            rows[orm.user_books_read_table].append({'book_id': book.book_id, 'user_id': user_ids[user]})
+
+        shelve = user.shelve
+        shelve_id = len(rows[orm.shelves_table]) + 1
+        rows[orm.shelves_table].append({
+            'id': shelve_id,
+            'user_id': user_ids[user],
+            'to_read': shelve.to_read_list.uid,
+            'current': shelve.currently_reading_list.uid,
+            'read': shelve.read_list.uid,
+        })
+        # once mapped, the shelve backref can list a reading list twice, the ORM only ever stores it once
+        for reading_list in dict.fromkeys(shelve.reading_lists):
+            rows[orm.reading_lists_table].append({
+                'id': reading_list.uid,
+                'name': reading_list.name,
+                'is_public': reading_list.is_public,
+                'type': class_mapper(type(reading_list)).polymorphic_identity,
+                'shelve_id': shelve_id,
+            })
+            # books are listed last in first out, entries are stored in the order they were added
+            for book in reversed(reading_list.books):
+                rows[orm.reading_list_entry_table].append({'book_id': book.book_id,
+                                                           'reading_list_id': reading_list.uid})
+            if isinstance(reading_list, BundledReadingList):
+                for other in dict.fromkeys(shelve.reading_lists):
+                    if reading_list.is_bundled_with(other):
+                        rows[orm.bundled_reading_list_info].append({'list_id_a': reading_list.uid,
+                                                                    'list_id_b': other.uid})
+
+    for review in reviews:
+        rows[orm.reviews_table].append({
+            'id': len(rows[orm.reviews_table]) + 1,
+            'book_id': review.book.book_id,
+            'user_id': user_ids[review.user],
+            'text': review.review_text,
+            'rating': review.rating,
+            'timestamp': review.timestamp,
+        })
+    return rows
+
+
 # remove because inventory is not used
 # def load_inventory(data_path: Path, repo: AbstractRepository, database_mode: bool):
 #     inventory_filename = str(data_path / "stockentry.csv")
@@ -0,0 +1,98 @@
+from typing import Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool
+
+# Set on every new SQLite connection. WAL lets readers carry on while a writer commits, NORMAL only syncs at
+# checkpoints in WAL mode, and the page cache and memory map keep the hot part of the file out of read() calls.
+SQLITE_CONNECT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative sizes are in KiB
+}
+
+# null opens a connection per checkout, queue shares pool_size connections between threads,
+# singleton keeps one connection per thread
+POOL_CLASSES = {
+    'null': NullPool,
+    'queue': QueuePool,
+    'singleton': SingletonThreadPool,
+}
+
+
+class PoolStatistics:
+    """counts the connections an engine opens and hands out, the pool itself only reports its current state"""
+
+    def __init__(self, engine: Engine):
+        self.__engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        event.listen(engine, 'connect', self.__on_connect)
+        event.listen(engine, 'checkout', self.__on_checkout)
+        event.listen(engine, 'checkin', self.__on_checkin)
+
+    def __on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def __on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+
+    def __on_checkin(self, dbapi_connection, connection_record):
+        self.checkins += 1
+
+    def as_dict(self) -> Dict:
+        pool = self.__engine.pool
+        statistics = {
+            'pool': type(pool).__name__,
+            'status': pool.status(),
+            'connects': self.connects,
+            'checkouts': self.checkouts,
+            'checkins': self.checkins,
+        }
+        if isinstance(pool, QueuePool):
+            statistics.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(),
+                              overflow=pool.overflow())
+        return statistics
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_CONNECT_PRAGMAS.items():
+        cursor.execute('PRAGMA %s = %s' % (pragma, value))
+    cursor.close()
+
+
+def is_in_memory(database_uri: str) -> bool:
+    return database_uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in database_uri
+
+
+def create_database_engine(database_uri: str, pool: str = 'null', pool_size: int = 5, echo: bool = False) -> Engine:
+    """
+    Create the engine the app runs on.
+    :param database_uri: SQLAlchemy database URI
+    :param pool: one of POOL_CLASSES
+    :param pool_size: connections kept open by the queue pool
+    :param echo: log every statement
+    :return: the engine, with a PoolStatistics as engine.pool_statistics
+    """
+    if pool not in POOL_CLASSES:
+        raise ValueError("Invalid pool: %s" % pool)
+    poolclass = POOL_CLASSES[pool]
+    if poolclass is QueuePool and is_in_memory(database_uri):
+        # every connection to an in-memory database is a database of its own, so each thread keeps its one
+        poolclass = SingletonThreadPool
+    pool_args = dict()
+    if poolclass is QueuePool:
+        pool_args = dict(pool_size=pool_size, max_overflow=pool_size)
+    elif poolclass is SingletonThreadPool:
+        pool_args = dict(pool_size=pool_size)
+
+    engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=poolclass,
+                           echo=echo, **pool_args)
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', set_sqlite_pragmas)
+    engine.pool_statistics = PoolStatistics(engine)
+    return engine
@@ -1,18 +1,46 @@
-from typing import List
+from typing import Dict, List, Optional
 
+from sqlalchemy import func, text, Table
 from sqlalchemy.orm.exc import NoResultFound
 
-from sqlalchemy.orm import scoped_session
+from sqlalchemy.orm import scoped_session, joinedload, selectinload
 from flask import _app_ctx_stack
 
 from library.domain.model import User, Review, Publisher, Author, BooksInventory, ReadingList, Book, Shelve
-from library.adapters.repository import AbstractRepository
+from library.adapters.orm import book_title_fts_name, books_table, reading_list_entry_table, reviews_table
+from library.adapters.repository import AbstractRepository, REVIEWS_NEWEST_FIRST, REVIEWS_HIGHEST_RATING_FIRST
+
+
+# SQLite settings used while bulk loading: the load can simply be rerun if the machine crashes half way
+BULK_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+}
+BULK_INSERT_BATCH_SIZE = 10000
+# SQLite builds before 3.32 refuse statements with more than 999 bound parameters
+MAX_BOUND_PARAMETERS = 999
+
+
+def book_loading_options():
+    """load what book_to_dict reads together with the books, instead of one lazy load per book and relationship"""
+    return (
+        joinedload(Book._Book__publisher),
+        selectinload(Book._Book__authors),
+    )
+
+
+def current_scope():
+    """the app context of the request being served, or the thread outside of one (start up, scripts, tests)"""
+    app_context = _app_ctx_stack.top
+    if app_context is not None:
+        return app_context
+    return _app_ctx_stack.__ident_func__()
 
 
 class SessionContextManager:
     def __init__(self, session_factory):
-        self.__session_factory = session_factory
-        self.__session = scoped_session(self.__session_factory, scopefunc=_app_ctx_stack.__ident_func__)
+        # one registry for the life of the app, it gives every app context (so every request) a session of its own
+        self.__session = scoped_session(session_factory, scopefunc=current_scope)
 
     def __enter__(self):
         return self
@@ -31,14 +59,13 @@ class SessionContextManager:
         self.__session.rollback()
 
     def reset_session(self):
-        # this method can be used e.g. to allow Flask to start a new session for each http request,
-        # via the 'before_request' callback
+        # the next use of the session in the current scope starts a fresh one
         self.close_current_session()
-        self.__session = scoped_session(self.__session_factory, scopefunc=_app_ctx_stack.__ident_func__)
 
     def close_current_session(self):
-        if not self.__session is None:
-            self.__session.close()
+        # closes the session of the current scope and drops it from the registry, Flask calls this at the
+        # end of every request via the 'teardown_appcontext' callback
+        self.__session.remove()
 
 
 class SqlAlchemyRepository(AbstractRepository):
@@ -48,6 +75,7 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def __init__(self, session_factory):
         self._session_cm = SessionContextManager(session_factory)
+        self.__has_title_fts = None
 
     def close_session(self):
         self._session_cm.close_current_session()
@@ -55,9 +83,51 @@ class SqlAlchemyRepository(AbstractRepository):
     def reset_session(self):
         self._session_cm.reset_session()
 
+    def bulk_insert(self, rows: Dict[Table, List[dict]], relax_durability: bool = True):
+        """
+        Insert rows straight through the Core, one transaction and one executemany per batch of each table.
+        :param rows: rows of each table, tables are filled in the given order
+        :param relax_durability: turn off SQLite journaling and syncing for the duration of the load
+        """
+        engine = self._session_cm.session.get_bind()
+        with engine.connect() as connection:
+            previous_pragmas = dict()
+            if relax_durability and connection.dialect.name == 'sqlite':
+                for pragma, value in BULK_LOAD_PRAGMAS.items():
+                    previous_pragmas[pragma] = connection.exec_driver_sql('PRAGMA %s' % pragma).scalar()
+                    connection.exec_driver_sql('PRAGMA %s = %s' % (pragma, value))
+            try:
+                for table, table_rows in rows.items():
+                    if not table_rows:
+                        continue
+                    with connection.begin():
+                        for start in range(0, len(table_rows), BULK_INSERT_BATCH_SIZE):
+                            connection.execute(table.insert(), table_rows[start:start + BULK_INSERT_BATCH_SIZE])
+            finally:
+                for pragma, value in previous_pragmas.items():
+                    connection.exec_driver_sql('PRAGMA %s = %s' % (pragma, value))
+
+    def pool_statistics(self) -> Dict:
+        """connection pool state and the connections opened and handed out so far, see database_engine.PoolStatistics"""
+        engine = self._session_cm.session.get_bind()
+        statistics = getattr(engine, 'pool_statistics', None)
+        if statistics is None:
+            # engine not made by create_database_engine
+            return {'pool': type(engine.pool).__name__, 'status': engine.pool.status()}
+        return statistics.as_dict()
+
     def like(self, str):
         return '%{}%'.format(str)
 
+    def has_title_fts(self) -> bool:
+        """whether the database was created with the title full-text index, databases from older versions are not"""
+        if self.__has_title_fts is None:
+            session = self._session_cm.session
+            self.__has_title_fts = session.get_bind().dialect.name == 'sqlite' and session.execute(
+                text("SELECT count(*) FROM sqlite_master WHERE name = :name"),
+                {'name': book_title_fts_name}).scalar() > 0
+        return self.__has_title_fts
+
     def get_ids(self, books: List[Book]):
         return [book.book_id for book in books]
 
@@ -95,14 +165,8 @@ class SqlAlchemyRepository(AbstractRepository):
             scm.commit()
 
     def get_book(self, book_id: int) -> Book:
-        book = None
-        try:
-            book = self._session_cm.session.query(Book).filter(Book._Book__id == book_id).one()
-        except NoResultFound:
-            # Ignore any exception and return None.
-            pass
-
-        return book
+        # a book already loaded in this session is returned from the identity map without a query
+        return self._session_cm.session.get(Book, book_id, options=book_loading_options())
 
     def get_books_by_year(self, target_yr: int) -> List[Book]:
         books_by_year = self._session_cm.session.query(Book).filter(Book._Book__release_year == target_yr).all()
@@ -112,17 +176,43 @@ class SqlAlchemyRepository(AbstractRepository):
         books_after_year = self._session_cm.session.query(Book).filter(Book._Book__release_year >= target_yr).all()
         return books_after_year
 
+    def get_books_in_year_range(self, start_yr: Optional[int], end_yr: Optional[int]) -> List[Book]:
+        # the whole catalog when the search index is built, see books.services.get_search_index
+        query = self._session_cm.session.query(Book).options(*book_loading_options())
+        if start_yr is not None:
+            query = query.filter(Book._Book__release_year >= start_yr)
+        if end_yr is not None:
+            query = query.filter(Book._Book__release_year <= end_yr)
+        return query.all()
+
     def get_number_of_books(self) -> int:
         number_of_books = self._session_cm.session.query(Book).count()
         return number_of_books
 
+    def get_books_version(self) -> tuple:
+        # books may be added by other processes, the table tells
+        number_of_books, last_book_id = self._session_cm.session.query(
+            func.count(books_table.c.id), func.max(books_table.c.id)).one()
+        return number_of_books, last_book_id
+
     def get_books_by_id(self, id_list) -> List[Book]:
-        books_by_id = self._session_cm.session.query(Book).filter(Book._Book__id.in_(id_list)).all()
-        books_by_id = list(filter(lambda x: x is not None,
-                                  [next((book for book in books_by_id if book.book_id == id), None) for id in id_list]))
-        return books_by_id
+        id_list = list(id_list)
+        unique_ids = list(dict.fromkeys(id_list))
+        books_by_id = dict()
+        # one IN query per chunk keeps long reading lists and result sets under the bound parameter limit
+        for start in range(0, len(unique_ids), MAX_BOUND_PARAMETERS):
+            books = self._session_cm.session.query(Book).options(*book_loading_options()).filter(
+                Book._Book__id.in_(unique_ids[start:start + MAX_BOUND_PARAMETERS])).all()
+            books_by_id.update((book.book_id, book) for book in books)
+        return [books_by_id[book_id] for book_id in id_list if book_id in books_by_id]
 
     def get_book_ids_by_title(self, title: str) -> List[int]:
+        # the trigram index cannot match anything shorter than a trigram, those still go through LIKE
+        if len(title) >= 3 and self.has_title_fts():
+            rows = self._session_cm.session.execute(
+                text("SELECT rowid FROM {0} WHERE {0} MATCH :phrase ORDER BY rowid".format(book_title_fts_name)),
+                {'phrase': '"%s"' % title.replace('"', '""')})
+            return [row[0] for row in rows]
         books_ids_by_title = self._session_cm.session.query(Book).filter(Book._Book__title.like(self.like(title))).all()
         books_ids_by_title = self.get_ids(books_ids_by_title)
         return books_ids_by_title
@@ -151,6 +241,10 @@ class SqlAlchemyRepository(AbstractRepository):
         publishers = self._session_cm.session.query(Publisher).all()
         return publishers
 
+    def get_publisher_by_name(self, publisher_name: str) -> Publisher:
+        return self._session_cm.session.query(Publisher).filter(
+            func.lower(Publisher._Publisher__name) == publisher_name.lower()).first()
+
     def add_review(self, review: Review, user: User):
         super().add_review(review, user)
         with self._session_cm as scm:
@@ -161,9 +255,34 @@ class SqlAlchemyRepository(AbstractRepository):
         reviews = self._session_cm.session.query(Review).all()
         return reviews
 
-    def get_reviews_for_book(self, book: Book):
-        reviews_for_book = self._session_cm.session.query(Review).filter(Review._Review__book == book).all()
-        return reviews_for_book
+    def get_reviews_for_book(self, book: Book, order: Optional[str] = None, offset: int = 0,
+                             limit: Optional[int] = None) -> List[Review]:
+        # every order is read from a (book_id, ...) index, so a page is found without sorting all the reviews
+        if order == REVIEWS_NEWEST_FIRST:
+            order_by = (Review._Review__timestamp.desc(), reviews_table.c.id.desc())
+        elif order == REVIEWS_HIGHEST_RATING_FIRST:
+            order_by = (Review._Review__rating.desc(), Review._Review__timestamp.desc(), reviews_table.c.id.desc())
+        else:
+            order_by = (reviews_table.c.id,)
+        query = self._session_cm.session.query(Review).options(selectinload(Review._Review__user)).filter(
+            Review._Review__book == book).order_by(*order_by)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def get_number_of_reviews_for_book(self, book: Book) -> int:
+        return self._session_cm.session.query(func.count(reviews_table.c.id)).filter(
+            reviews_table.c.book_id == book.book_id).scalar()
+
+    def get_recent_reviews_for_user(self, user: User, k: int) -> List[Review]:
+        # answered from the (user_id, timestamp) index, newest first, without sorting the user's reviews
+        return self._session_cm.session.query(Review).options(
+            joinedload(Review._Review__book).joinedload(Book._Book__publisher),
+            joinedload(Review._Review__book).selectinload(Book._Book__authors),
+        ).filter(Review._Review__user == user).order_by(
+            Review._Review__timestamp.desc(), reviews_table.c.id.desc()).limit(k).all()
 
     def get_author_by_name(self, author_name: str) -> Author:
         author_by_name = None
@@ -204,10 +323,23 @@ class SqlAlchemyRepository(AbstractRepository):
     def get_reading_list_by_id(self, id_: int) -> ReadingList:
         reading_list_by_id = None
         try:
-            reading_list_by_id = self._session_cm.session.query(ReadingList).filter(
-                ReadingList._ReadingList__uid == id_).one()
+            reading_list_by_id = self._session_cm.session.query(ReadingList).options(
+                joinedload(ReadingList._ReadingList__shelve).joinedload(Shelve._Shelve__user),
+                selectinload(ReadingList._ReadingList__books).options(*book_loading_options()),
+            ).filter(ReadingList._ReadingList__uid == id_).one()
         except NoResultFound:
             # Ignore any exception and return None.
             pass
 
         return reading_list_by_id
+
+    def get_last_books_of_reading_list(self, reading_list: ReadingList, k: int) -> List[Book]:
+        # entries are numbered in the order the books were added, the list's collection is left unloaded
+        return self._session_cm.session.query(Book).options(*book_loading_options()).join(
+            reading_list_entry_table, reading_list_entry_table.c.book_id == books_table.c.id).filter(
+            reading_list_entry_table.c.reading_list_id == reading_list.uid).order_by(
+            reading_list_entry_table.c.id.desc()).limit(k).all()
+
+    def get_reading_list_size(self, reading_list: ReadingList) -> int:
+        return self._session_cm.session.query(func.count(reading_list_entry_table.c.id)).filter(
+            reading_list_entry_table.c.reading_list_id == reading_list.uid).scalar()
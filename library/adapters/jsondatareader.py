@@ -1,15 +1,137 @@
 import json
-from typing import Any
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
 
 from library.domain.model import *
 from utils import Checks
 
+# the only fields of each dump the domain objects are built from, the rest (popular_shelves, similar_books, ...) is
+# dropped as soon as a line is parsed
+AUTHOR_FIELDS = ('author_id', 'name', 'average_rating', 'ratings_count', 'text_reviews_count')
+BOOK_FIELDS = ('book_id', 'title', 'description', 'is_ebook', 'image_url', 'url', 'num_pages', 'publication_year',
+               'publisher', 'authors', 'ratings_count', 'average_rating', 'text_reviews_count')
+
+# lines read between two progress reports
+PROGRESS_INTERVAL = 10000
+
+# parallel parsing splits a file into this many shards per worker, so a slow shard does not hold up the others, and
+# files smaller than PARALLEL_PARSE_MIN_BYTES are parsed serially as starting workers would cost more than it saves
+SHARDS_PER_WORKER = 4
+PARALLEL_PARSE_MIN_BYTES = 1024 * 1024
+# parsed shards are held in memory until they are yielded: bigger files are cut into more shards, and only this many
+# shards per worker are parsed ahead of the one being yielded
+SHARD_MAX_BYTES = 16 * 1024 * 1024
+SHARDS_IN_FLIGHT_PER_WORKER = 2
+
+# progress(file name, lines read, bytes read)
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def iter_json_lines(file_name: str, fields: Optional[Iterable[str]] = None,
+                    progress: Optional[ProgressCallback] = None, start: int = 0,
+                    end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Parse a JSON-lines file one line at a time, only the current line is held in memory.
+    :param file_name: file with one JSON object per line, blank lines are skipped
+    :param fields: keep only these keys of every object, all of them when None
+    :param progress: called every PROGRESS_INTERVAL lines and once at the end of the file
+    :param start: offset of the first line to read
+    :param end: offset to stop at, the end of the file when None; start and end have to be line boundaries
+    """
+    fields = None if fields is None else tuple(fields)
+    lines_read = 0
+    bytes_read = 0
+    with open(file_name, 'rb') as json_file:
+        json_file.seek(start)
+        for line in json_file:
+            if end is not None and start + bytes_read >= end:
+                break
+            lines_read += 1
+            bytes_read += len(line)
+            if progress is not None and lines_read % PROGRESS_INTERVAL == 0:
+                progress(str(file_name), lines_read, bytes_read)
+            if line.isspace():
+                continue
+            json_object = json.loads(line)
+            if fields is not None:
+                json_object = {field: json_object[field] for field in fields if field in json_object}
+            yield json_object
+    if progress is not None and (lines_read == 0 or lines_read % PROGRESS_INTERVAL != 0):
+        progress(str(file_name), lines_read, bytes_read)
+
+
+def json_line_shards(file_name: str, shards: int) -> List[Tuple[int, int]]:
+    """
+    Split a JSON-lines file into at most shards byte ranges of about the same size, each starting at a line.
+    :return: (start, end) offsets, in file order
+    """
+    size = os.path.getsize(file_name)
+    boundaries = [0]
+    with open(file_name, 'rb') as json_file:
+        for shard in range(1, shards):
+            offset = size * shard // shards
+            if offset <= boundaries[-1]:
+                continue
+            # move on to the start of the next line
+            json_file.seek(offset - 1)
+            json_file.readline()
+            if json_file.tell() >= size:
+                break
+            if json_file.tell() > boundaries[-1]:
+                boundaries.append(json_file.tell())
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _parse_json_line_shard(file_name: str, fields: Optional[Tuple[str, ...]], start: int,
+                           end: int) -> Tuple[List[Dict[str, Any]], int, int]:
+    reports = []
+    json_objects = list(iter_json_lines(file_name, fields, lambda *report: reports.append(report), start, end))
+    return json_objects, reports[-1][1], reports[-1][2]
+
+
+def iter_json_lines_parallel(file_name: str, fields: Optional[Iterable[str]] = None, workers: int = 2,
+                             progress: Optional[ProgressCallback] = None) -> Iterator[Dict[str, Any]]:
+    """
+    iter_json_lines with the parsing spread over a pool of worker processes. The file is split into shards, several
+    per worker and none over SHARD_MAX_BYTES, and the parsed objects are yielded in file order, the same objects
+    iter_json_lines yields. At most SHARDS_IN_FLIGHT_PER_WORKER shards per worker are parsed or waiting at a time.
+    Progress is reported once per shard.
+    """
+    fields = None if fields is None else tuple(fields)
+    number_of_shards = max(workers * SHARDS_PER_WORKER, -(-os.path.getsize(file_name) // SHARD_MAX_BYTES))
+    shards = iter(json_line_shards(file_name, number_of_shards))
+    lines_read = 0
+    bytes_read = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = deque()
+        while True:
+            while len(futures) < workers * SHARDS_IN_FLIGHT_PER_WORKER:
+                shard = next(shards, None)
+                if shard is None:
+                    break
+                futures.append(executor.submit(_parse_json_line_shard, file_name, fields, *shard))
+            if not futures:
+                break
+            json_objects, shard_lines, shard_bytes = futures.popleft().result()
+            lines_read += shard_lines
+            bytes_read += shard_bytes
+            if progress is not None:
+                progress(str(file_name), lines_read, bytes_read)
+            yield from json_objects
+
 
 class BooksJSONReader:
 
-    def __init__(self, books_file_name: str, authors_file_name: str):
+    def __init__(self, books_file_name: str, authors_file_name: str, progress: Optional[ProgressCallback] = None,
+                 workers: int = 1):
         self.__books_file_name = books_file_name
         self.__authors_file_name = authors_file_name
+        self.__progress = progress
+        # processes parsing the dumps, the domain objects are still made in this process and in file order
+        self.__workers = workers
 
         self.__dataset_of_books = []
         self.__authors: Dict[int, Author] = dict()
@@ -27,73 +149,63 @@ class BooksJSONReader:
     def dataset_of_publishers(self):
         return self.__publishers.values()
 
+    def __iter_json_lines(self, file_name: str, fields: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        if self.__workers > 1 and os.path.getsize(file_name) >= PARALLEL_PARSE_MIN_BYTES:
+            return iter_json_lines_parallel(file_name, fields, self.__workers, self.__progress)
+        return iter_json_lines(file_name, fields, self.__progress)
+
     def __read_authors(self):
         # book authors excerpt
         self.__authors = dict()
-        with open(self.__authors_file_name) as author_file:
-            lines = author_file.readlines()
-            author_jsons: List[Dict[str, Any]] = [json.loads(line) for line in lines]
-            author_file.close()
-
-        # debug purposed
-        # print(json.dumps(author_jsons[94], sort_keys=True, indent=4))
-        for author_json in author_jsons:
-            author_new = Author(int(author_json['author_id']), author_json['name'])
+        for author_json in self.__iter_json_lines(self.__authors_file_name, AUTHOR_FIELDS):
+            author_new = self.__make_author(author_json)
+            self.__authors[author_new.unique_id] = author_new
 
-            # optional
-            author_new.average_rating = float(author_json['average_rating'])
-            author_new.ratings_count = int(author_json['ratings_count'])
-            author_new.text_reviews_count = int(author_json['text_reviews_count'])
+    def __make_author(self, author_json: Dict[str, Any]) -> Author:
+        author_new = Author(int(author_json['author_id']), author_json['name'])
 
-            self.__authors[int(author_json['author_id'])] = author_new
+        # optional
+        author_new.average_rating = float(author_json['average_rating'])
+        author_new.ratings_count = int(author_json['ratings_count'])
+        author_new.text_reviews_count = int(author_json['text_reviews_count'])
+        return author_new
 
     def __read_books(self):
         # comic books excerpt
-        with open(self.__books_file_name) as book_file:
-            lines = book_file.readlines()
-            book_jsons: List[Dict[str, Any]] = [json.loads(line) for line in lines]
-            book_file.close()
-
-        # debug purposed
-        # del book_jsons[8]['popular_shelves']
-        # del book_jsons[8]['similar_books']
-        # print()
-        # print(json.dumps(book_jsons[8], indent=1))
-
-        for book_json in book_jsons:
-            book = Book(int(book_json['book_id']), book_json['title'])
-            book.description = book_json['description']
-            book.ebook = book_json['is_ebook'].lower() == "true"
-            book.img_url = book_json['image_url']
-            book.website_url = book_json['url']
-            if book_json['num_pages'] != "":
-                book.num_pages = int(book_json['num_pages'])
-            try:
-                book.release_year = int(book_json['publication_year'])
-            except ValueError:
-                pass
-
-            # publisher
-            publisher_name = book_json['publisher']
-            if publisher_name in self.__publishers:
-                book.publisher = self.__publishers[publisher_name]
-            else:
-                publisher = Publisher(publisher_name)
-                book.publisher = publisher
-                self.__publishers[publisher_name] = publisher
-
-            # author
-            for author_json in book_json['authors']:
-                author_new = self.__authors[int(author_json['author_id'])]
-                for author in book.authors:
-                    author_new.add_coauthor(author)
-                book.add_author(author_new)
-            self.dataset_of_books.append(book)
-
-            # optional
-            book.ratings_count = int(book_json['ratings_count'])
-            book.average_rating = float(book_json['average_rating'])
-            book.text_reviews_count = int(book_json['text_reviews_count'])
+        for book_json in self.__iter_json_lines(self.__books_file_name, BOOK_FIELDS):
+            self.dataset_of_books.append(self.__make_book(book_json))
+
+    def __make_book(self, book_json: Dict[str, Any]) -> Book:
+        book = Book(int(book_json['book_id']), book_json['title'])
+        book.description = book_json['description']
+        book.ebook = book_json['is_ebook'].lower() == "true"
+        book.img_url = book_json['image_url']
+        book.website_url = book_json['url']
+        if book_json['num_pages'] != "":
+            book.num_pages = int(book_json['num_pages'])
+        try:
+            book.release_year = int(book_json['publication_year'])
+        except ValueError:
+            pass
+
+        # publisher
+        publisher_name = book_json['publisher']
+        if publisher_name in self.__publishers:
+            book.publisher = self.__publishers[publisher_name]
+        else:
+            publisher = Publisher(publisher_name)
+            book.publisher = publisher
+            self.__publishers[publisher_name] = publisher
+
+        # author
+        for author_json in book_json['authors']:
+            book.add_author(self.__authors[int(author_json['author_id'])])
+
+        # optional
+        book.ratings_count = int(book_json['ratings_count'])
+        book.average_rating = float(book_json['average_rating'])
+        book.text_reviews_count = int(book_json['text_reviews_count'])
+        return book
 
     def read_json_files(self):
         try:
@@ -1,7 +1,20 @@
-from typing import List, Dict
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from itertools import islice
+from typing import List, Dict, Optional, Tuple
 from library.domain.model import Book, Shelve
-from library.adapters.repository import AbstractRepository
+from library.adapters.repository import AbstractRepository, REVIEWS_NEWEST_FIRST, REVIEWS_HIGHEST_RATING_FIRST
+from library.adapters.title_index import TitleIndex
 from library.domain.model import User, Review, Publisher, Author, BooksInventory, ReadingList
+from utils import insort_by_key
+
+
+# get_reviews_for_book orders, both descending. The sorted reviews are kept ascending and read from the end, so that
+# a new review, most often the newest one, is appended and reviews with equal keys come newest first as in SQL
+REVIEW_SORT_KEYS = {
+    REVIEWS_NEWEST_FIRST: lambda review: review.timestamp,
+    REVIEWS_HIGHEST_RATING_FIRST: lambda review: (review.rating, review.timestamp),
+}
 
 
 class MemoryRepository(AbstractRepository):
@@ -11,55 +24,101 @@ class MemoryRepository(AbstractRepository):
 
     def __init__(self):
         self.__authors: List[Author] = []
+        self.__author_index: Dict[int, Author] = {}
+        self.__author_name_index: Dict[str, Author] = {}
+        self.__author_book_ids: Dict[Author, List[int]] = {}
         self.__users: List[User] = []
+        self.__user_index: Dict[str, User] = {}
         self.__books: List[Book] = []
+        self.__books_added = 0
         self.__publishers: List[Publisher] = []
+        self.__publisher_name_index: Dict[str, Publisher] = {}
+        self.__publisher_book_ids: Dict[Publisher, List[int]] = {}
         self.__reviews: List[Review] = []
+        # book id -> its reviews in the order they were added, and kept sorted the other ways once they are asked for
+        self.__book_reviews: Dict[int, List[Review]] = {}
+        self.__sorted_book_reviews: Dict[Tuple[int, str], List[Review]] = {}
         # self.__book_inventory: BooksInventory = BooksInventory()
         self.__book_index: Dict[int, Book] = {}
+        # position of each book in the catalog, used to keep query results in insertion order
+        self.__book_order: Dict[int, int] = {}
+        # release year -> books of that year in catalog order, plus the sorted list of years present
+        self.__year_index: Dict[int, List[Book]] = {}
+        self.__years: List[int] = []
+        self.__title_index: TitleIndex = TitleIndex()
         self.__shelves: List[Shelve] = []
         self.__reading_lists: Dict[int, ReadingList] = {}
 
     def add_user(self, user: User):
         self.__users.append(user)
+        # user names are stored lower-cased by User, first registration wins as with the old linear scan
+        self.__user_index.setdefault(user.user_name, user)
 
     def get_user(self, user_name) -> User:
-        return next((user for user in self.__users if user.user_name == user_name.lower()), None)
+        return self.__user_index.get(user_name.lower())
 
     def add_author(self, author: Author):
         self.__authors.append(author)
+        self.__author_index.setdefault(author.unique_id, author)
+        self.__author_name_index.setdefault(author.full_name, author)
 
     def get_author(self, author_id) -> Author:
-        return next((author for author in self.__authors if author.unique_id == author_id), None)
+        return self.__author_index.get(author_id)
 
     def add_book(self, book: Book):
+        self.__book_order.setdefault(book.book_id, len(self.__books))
         self.__books.append(book)
+        self.__books_added += 1
         self.__book_index[book.book_id] = book
+        if book.release_year not in self.__year_index:
+            self.__year_index[book.release_year] = []
+            insort(self.__years, book.release_year)
+        self.__year_index[book.release_year].append(book)
+        self.__title_index.add(book.book_id, book.title)
+        # authors and publisher are indexed as they are when the book is added
+        for author in book.authors:
+            self.__author_book_ids.setdefault(author, []).append(book.book_id)
+        self.__publisher_book_ids.setdefault(book.publisher, []).append(book.book_id)
 
     def get_book(self, book_id: int) -> Book:
         return self.__book_index[book_id] if book_id in self.__book_index else None
 
     def get_books_by_year(self, target_yr: int) -> List[Book]:
-        return [book for book in self.__books if book.release_year == target_yr]
+        return list(self.__year_index.get(target_yr, []))
 
     def get_books_after_year_inclusive(self, target_yr: int) -> List[Book]:
-        return [book for book in self.__books if book.release_year >= target_yr]
+        return self.get_books_in_year_range(target_yr, None)
+
+    def get_books_in_year_range(self, start_yr: Optional[int], end_yr: Optional[int]) -> List[Book]:
+        low = 0 if start_yr is None else bisect_left(self.__years, start_yr)
+        high = len(self.__years) if end_yr is None else bisect_right(self.__years, end_yr)
+        buckets = [self.__year_index[year] for year in self.__years[low:high]]
+        if len(buckets) == 1:
+            return list(buckets[0])
+        # every bucket is already in catalog order, so a k-way merge restores the overall order
+        return list(merge(*buckets, key=lambda book: self.__book_order[book.book_id]))
 
     def get_number_of_books(self) -> int:
         return self.__books.__len__()
 
+    def get_books_version(self) -> int:
+        return self.__books_added + Book.changes
+
     def get_books_by_id(self, id_list) -> List[Book]:
         return list(filter(lambda x: x is not None, map(self.get_book, id_list)))
 
     def get_book_ids_by_title(self, title: str) -> List[int]:
-        title = title.lower()
-        return [book.book_id for book in self.__books if title in book.title.lower()]
+        return self.__title_index.search(title)
 
     def get_book_ids_for_publisher(self, publisher: Publisher) -> List[int]:
-        return [book.book_id for book in self.__books if book.publisher == publisher]
+        return list(self.__publisher_book_ids.get(publisher, []))
 
     def add_publisher(self, publisher: Publisher):
         self.__publishers.append(publisher)
+        self.__publisher_name_index.setdefault(publisher.name.lower(), publisher)
+
+    def get_publisher_by_name(self, publisher_name: str) -> Publisher:
+        return self.__publisher_name_index.get(publisher_name.lower())
 
     def get_publishers(self) -> List[Publisher]:
         return self.__publishers
@@ -67,22 +126,45 @@ class MemoryRepository(AbstractRepository):
     def add_review(self, review: Review, user: User):
         super(MemoryRepository, self).add_review(review, user)
         self.__reviews.append(review)
+        book_id = review.book.book_id
+        self.__book_reviews.setdefault(book_id, []).append(review)
+        for order, key in REVIEW_SORT_KEYS.items():
+            sorted_reviews = self.__sorted_book_reviews.get((book_id, order))
+            if sorted_reviews is not None:
+                insort_by_key(sorted_reviews, review, key)
 
     def get_reviews(self) -> List[Review]:
         return self.__reviews
 
-    def get_reviews_for_book(self, book: Book):
-        return [review for review in self.__reviews if review.book == book]
+    def get_reviews_for_book(self, book: Book, order: Optional[str] = None, offset: int = 0,
+                             limit: Optional[int] = None) -> List[Review]:
+        reviews = self.__book_reviews.get(book.book_id, [])
+        if order not in REVIEW_SORT_KEYS:
+            return list(islice(reviews, offset, None if limit is None else offset + limit))
+        # only the orders pages are read in are kept, sorted once and then updated by add_review
+        sorted_reviews = self.__sorted_book_reviews.get((book.book_id, order))
+        if sorted_reviews is None:
+            sorted_reviews = sorted(reviews, key=REVIEW_SORT_KEYS[order])
+            self.__sorted_book_reviews[(book.book_id, order)] = sorted_reviews
+        end = max(len(sorted_reviews) - offset, 0)
+        start = 0 if limit is None else max(end - limit, 0)
+        return sorted_reviews[start:end][::-1]
+
+    def get_number_of_reviews_for_book(self, book: Book) -> int:
+        return len(self.__book_reviews.get(book.book_id, []))
+
+    def get_recent_reviews_for_user(self, user: User, k: int) -> List[Review]:
+        return user.get_recent_reviews(k)
 
     # remove because inventory is not used
     # def get_books_inventory(self) -> BooksInventory:
     #     return self.__book_inventory
 
     def get_author_by_name(self, author_name: str) -> Author:
-        return next((author for author in self.__authors if author.full_name == author_name), None)
+        return self.__author_name_index.get(author_name)
 
     def get_book_ids_by_author(self, author: Author) -> List[Book]:
-        return [book.book_id for book in self.__books if author in book.authors]
+        return list(self.__author_book_ids.get(author, []))
 
     def get_book_ids_by_publisher(self, publisher: Publisher) -> List[Book]:
         return self.get_book_ids_for_publisher(publisher)
@@ -109,4 +191,10 @@ class MemoryRepository(AbstractRepository):
     def get_reading_list_by_id(self, id_: int) -> ReadingList:
         return self.__reading_lists[id_] if id_ in self.__reading_lists else None
 
+    def get_last_books_of_reading_list(self, reading_list: ReadingList, k: int) -> List[Book]:
+        return list(islice(reading_list.books, k))
+
+    def get_reading_list_size(self, reading_list: ReadingList) -> int:
+        return len(reading_list)
+
 
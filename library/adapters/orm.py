@@ -1,7 +1,10 @@
+from typing import Optional
+
 from sqlalchemy import (
     Table, MetaData, Column, Integer, String, Date, DateTime,
-    ForeignKey, UniqueConstraint, Boolean
+    ForeignKey, UniqueConstraint, Index, Boolean, DDL, event, func
 )
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.orm import mapper, relationship, synonym, backref
 
 from library.domain import model
@@ -22,6 +25,8 @@ publishers_table = Table(
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('name', String(255), nullable=False, unique=True)
 )
+# publishers are looked up by name regardless of case
+Index('ix_publisher_name_lower', func.lower(publishers_table.c.name))
 
 books_table = Table(
     'book', metadata,
@@ -30,15 +35,39 @@ books_table = Table(
     Column('ebook', Boolean, nullable=False),
     Column('num_pages', Integer, nullable=False),
     Column('title', String(255), nullable=False, unique=True),
-    Column('publisher_id', ForeignKey('publisher.id')),
+    Column('publisher_id', ForeignKey('publisher.id'), index=True),
     Column('image_url', String(255), nullable=False),
     Column('description', String(1024), nullable=False),
-    Column('release_year', Integer, nullable=False),
+    Column('release_year', Integer, nullable=False, index=True),
     Column('average_rating', Integer, nullable=False),
     Column('rating_count', Integer, nullable=False),
     Column('text_reviews_count', Integer, nullable=False)
 )
 
+# Full-text index over book titles. The trigram tokenizer (SQLite 3.34+) lets MATCH answer substring queries of
+# 3 or more characters without scanning the book table; the triggers keep it in sync with every write to book.
+book_title_fts_name = 'book_title_fts'
+
+
+def supports_title_fts(ddl, target, bind, **kw):
+    return bind.dialect.name == 'sqlite' and bind.dialect.dbapi.sqlite_version_info >= (3, 34, 0)
+
+
+for statement in (
+        "CREATE VIRTUAL TABLE book_title_fts USING fts5("
+        "title, content='book', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER book_title_fts_insert AFTER INSERT ON book BEGIN "
+        "INSERT INTO book_title_fts(rowid, title) VALUES (new.id, new.title); END",
+        "CREATE TRIGGER book_title_fts_delete AFTER DELETE ON book BEGIN "
+        "INSERT INTO book_title_fts(book_title_fts, rowid, title) VALUES ('delete', old.id, old.title); END",
+        "CREATE TRIGGER book_title_fts_update AFTER UPDATE OF id, title ON book BEGIN "
+        "INSERT INTO book_title_fts(book_title_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+        "INSERT INTO book_title_fts(rowid, title) VALUES (new.id, new.title); END",
+):
+    event.listen(books_table, 'after_create', DDL(statement).execute_if(callable_=supports_title_fts))
+event.listen(books_table, 'after_drop',
+             DDL("DROP TABLE IF EXISTS book_title_fts").execute_if(callable_=supports_title_fts))
+
 reviews_table = Table(
     'review', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
@@ -48,11 +77,17 @@ reviews_table = Table(
     Column('rating', Integer, nullable=False),
     Column('timestamp', DateTime, nullable=False),
 )
+# the reviews of a user, in the order of the recent reviews on their profile
+Index('ix_review_user_id_timestamp', reviews_table.c.user_id, reviews_table.c.timestamp)
+# the pages of the reviews of a book, newest first and highest rating first
+Index('ix_review_book_id_timestamp', reviews_table.c.book_id, reviews_table.c.timestamp)
+Index('ix_review_book_id_rating_timestamp', reviews_table.c.book_id, reviews_table.c.rating,
+      reviews_table.c.timestamp)
 
 authors_table = Table(
     'author', metadata,
     Column('id', Integer, primary_key=True),
-    Column('full_name', String(255), nullable=False),
+    Column('full_name', String(255), nullable=False, index=True),
     Column('average_rating', Integer, nullable=False),
     Column('rating_count', Integer, nullable=False),
     Column('text_reviews_count', Integer, nullable=False)
@@ -61,15 +96,15 @@ authors_table = Table(
 book_authors_table = Table(
     'book_author', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('book_id', ForeignKey('book.id')),
-    Column('author_id', ForeignKey('author.id'))
+    Column('book_id', ForeignKey('book.id'), index=True),
+    Column('author_id', ForeignKey('author.id'), index=True)
 )
 
 user_books_read_table = Table(
     'user_books_read', metadata,
     # Column('id', Integer, primary_key=True, autoincrement=True),
     Column('book_id', ForeignKey('book.id'), primary_key=True),
-    Column('user_id', ForeignKey('user.id'), primary_key=True)
+    Column('user_id', ForeignKey('user.id'), primary_key=True, index=True)
 )
 
 reading_lists_table = Table(
@@ -78,27 +113,27 @@ reading_lists_table = Table(
     Column('name', String(255), nullable=False),
     Column('is_public', Boolean, nullable=False),
     Column('type', String(10), nullable=False),
-    Column('shelve_id', Integer, ForeignKey('shelve.id'))
+    Column('shelve_id', Integer, ForeignKey('shelve.id'), index=True)
 )
 
 reading_list_entry_table = Table(
     'reading_list_entry', metadata,
     Column('id', Integer, primary_key=True),
     Column('book_id', ForeignKey('book.id')),
-    Column('reading_list_id', ForeignKey('reading_list.id')),
+    Column('reading_list_id', ForeignKey('reading_list.id'), index=True),
     UniqueConstraint('book_id', 'reading_list_id', name='uix_1'),
 )
 
 bundled_reading_list_info = Table(
     'bundled_list', metadata,
-    Column('list_id_a', Integer, ForeignKey('reading_list.id')),
+    Column('list_id_a', Integer, ForeignKey('reading_list.id'), index=True),
     Column('list_id_b', Integer, ForeignKey('reading_list.id')),
 )
 
 shelves_table = Table(
     'shelve', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('user_id', ForeignKey('user.id')),
+    Column('user_id', ForeignKey('user.id'), index=True),
     Column('to_read', ForeignKey('reading_list.id'), nullable=True),
     Column('current', ForeignKey('reading_list.id'), nullable=True),
     Column('read', ForeignKey('reading_list.id'), nullable=True)
@@ -106,13 +141,40 @@ shelves_table = Table(
 )
 
 
+# indexes of databases created by earlier versions that are covered by the ones declared above
+replaced_index_names = ('ix_review_user_id', 'ix_review_book_id')
+
+
+def create_missing_indexes(bind):
+    """
+    metadata.create_all only creates the indexes of the tables it creates, the indexes added to a table since its
+    database was created are created here, and the ones they replace are dropped
+    """
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            # checkfirst does not see the indexes on expressions, SQLite checks the name itself
+            statement = str(CreateIndex(index).compile(dialect=bind.dialect))
+            bind.execute(DDL(statement.replace('INDEX ', 'INDEX IF NOT EXISTS ', 1)))
+    for index_name in replaced_index_names:
+        bind.execute(DDL('DROP INDEX IF EXISTS %s' % index_name))
+
+
+def forget_serialized_book(book: Optional[model.Book], attributes):
+    # None once the book has been garbage collected. Books are expired by every commit, which does not change them,
+    # so the serialised book is dropped without counting a change of the catalog
+    if book is not None:
+        book.forget_serialized()
+
+
 def map_model_to_tables():
+    # read books and the books of reading lists are loaded into the OrderedSets the domain model keeps them in
     mapper(model.User, users_table, properties={
         '_User__user_name': users_table.c.user_name,
         '_User__password': users_table.c.password,
         '_User__pages_read': users_table.c.pages_read,
-        '_User__read_books': relationship(model.Book, secondary=user_books_read_table),
-        '_User__reviews': relationship(model.Review, backref='_Review__user')
+        '_User__read_books': relationship(model.Book, secondary=user_books_read_table,
+                                          collection_class=model.OrderedSet),
+        '_User__reviews': relationship(model.Review, backref='_Review__user', order_by=reviews_table.c.timestamp)
     })
 
     mapper(model.Publisher, publishers_table, properties={
@@ -135,6 +197,8 @@ def map_model_to_tables():
         '_Book__authors': relationship(model.Author, secondary=book_authors_table),
         '_Book__reviews': relationship(model.Review, backref='_Review__book'),
     })
+    # expired books are loaded again without going through their setters
+    event.listen(model.Book, 'expire', forget_serialized_book)
 
     mapper(model.Review, reviews_table, properties={
         '_Review__text': reviews_table.c.text,
@@ -158,7 +222,8 @@ def map_model_to_tables():
             '_ReadingList__uid': reading_lists_table.c.id,
             '_ReadingList__name': reading_lists_table.c.name,
             '_ReadingList__is_public': reading_lists_table.c.is_public,
-            '_ReadingList__books': relationship(model.Book, secondary=reading_list_entry_table),
+            '_ReadingList__books': relationship(model.Book, secondary=reading_list_entry_table,
+                                                collection_class=model.OrderedSet),
             '_ReadingList__shelve': relationship(
                 model.Shelve,
                 foreign_keys=[reading_lists_table.c.shelve_id],
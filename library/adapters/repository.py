@@ -1,10 +1,16 @@
 import abc
 from datetime import date
-from typing import List, Optional
+from typing import Hashable, List, Optional
 
 from library.domain.model import Book, Publisher, Author, BooksInventory, User, Review, ReadingList, Shelve
 
 
+# orders of get_reviews_for_book besides the order the reviews were added in
+REVIEWS_NEWEST_FIRST = 'newest'
+REVIEWS_HIGHEST_RATING_FIRST = 'rating'
+REVIEW_ORDERS = (REVIEWS_NEWEST_FIRST, REVIEWS_HIGHEST_RATING_FIRST)
+
+
 class RepositoryException(Exception):
     def __init__(self, message=None):
         pass
@@ -62,11 +68,28 @@ class AbstractRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_books_in_year_range(self, start_yr: Optional[int], end_yr: Optional[int]) -> List[Book]:
+        """ Returns a list of Books that were published between start_yr and end_yr, both inclusive.
+
+        Either bound may be None to leave that side of the range open.
+        If there are no Books on the given condition, this method returns an empty list.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_number_of_books(self) -> int:
         """ Returns the number of Books in the repository. """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_books_version(self) -> Hashable:
+        """ Returns a value that changes whenever a Book is added to or removed from the catalog of the repository.
+
+        The memory repository also counts the changes made to the fields of its Books.
+        """
+        raise NotImplementedError
+
     # @abc.abstractmethod
     # def get_first_book(self) -> Book:
     #     """ Returns the first Book, ordered by date, from the repository.
@@ -109,6 +132,14 @@ class AbstractRepository(abc.ABC):
         """ Returns the Publishers stored in the repository. """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_publisher_by_name(self, publisher_name: str) -> Optional[Publisher]:
+        """ Returns the Publisher whose name matches publisher_name, ignoring case.
+
+        If there is no such Publisher, this method returns None.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_review(self, review: Review, user: User):
         """ Adds a Review to the repository.
@@ -126,7 +157,20 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_reviews_for_book(self, book: Book):
+    def get_reviews_for_book(self, book: Book, order: Optional[str] = None, offset: int = 0,
+                             limit: Optional[int] = None) -> List[Review]:
+        """ Returns the Reviews of book, in the order they were added unless order is one of REVIEW_ORDERS.
+        Highest rating first puts the newest first among equal ratings. offset and limit select one page of them.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_number_of_reviews_for_book(self, book: Book) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_recent_reviews_for_user(self, user: User, k: int) -> List[Review]:
+        """ Returns the k most recent Reviews written by user, newest first. """
         raise NotImplementedError
 
     # remove because inventory is not used
@@ -163,6 +207,15 @@ class AbstractRepository(abc.ABC):
     def get_reading_list_by_id(self, id: int) -> ReadingList:
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_last_books_of_reading_list(self, reading_list: ReadingList, k: int) -> List[Book]:
+        """ Returns the k Books last added to reading_list, the last one first, without loading the others. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_reading_list_size(self, reading_list: ReadingList) -> int:
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_reading_list(self, reading_list: ReadingList):
         raise NotImplementedError
@@ -1,12 +1,18 @@
 from pathlib import Path
 
-from library.adapters.data_importer import load_books_and_authors, load_shelves, load_users, load_reviews
+from library.adapters.data_importer import load_books_and_authors, load_shelves, load_users, load_reviews, bulk_load
 from library.adapters.repository import AbstractRepository
 
 
-def populate(data_path: Path, repo: AbstractRepository, database_mode: bool = False):
-    # publisher, book, authors
-    load_books_and_authors(data_path, repo, database_mode)
+def populate(data_path: Path, repo: AbstractRepository, database_mode: bool = False, bulk_mode: bool = False,
+             parse_workers: int = 1):
+    if database_mode and bulk_mode:
+        # one transaction and one batched insert per table instead of a commit per object
+        bulk_load(data_path, repo, parse_workers=parse_workers)
+        return
+
+    # publisher, book, authors (the json dumps are parsed by parse_workers processes)
+    load_books_and_authors(data_path, repo, database_mode, parse_workers)
     users = load_users(data_path, repo, database_mode)
     load_shelves(data_path, repo, users, database_mode)
     load_reviews(data_path, repo, database_mode)
@@ -0,0 +1,103 @@
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from library.adapters import data_importer, jsondatareader, memory_repository, title_index
+from library.adapters.memory_repository import MemoryRepository
+from library.adapters.repository_populate import populate
+from library.domain import model
+from library.domain.model import ReadingList
+
+# Written at the start of every snapshot, a snapshot with another magic or version is rebuilt.
+# Bump SNAPSHOT_VERSION whenever the layout below changes.
+SNAPSHOT_MAGIC = b'LIBRARY-SNAPSHOT'
+SNAPSHOT_VERSION = 1
+
+# the pickled objects are only valid for the code that built them
+SNAPSHOT_CODE_MODULES = (model, memory_repository, title_index, data_importer, jsondatareader)
+
+
+def file_signature(path: Path) -> str:
+    stat = path.stat()
+    return '%s:%d:%d' % (path.name, stat.st_size, stat.st_mtime_ns)
+
+
+def source_fingerprint(data_path: Path, snapshot_path: Optional[Path] = None) -> str:
+    """
+    Fingerprint of everything a snapshot is built from, the data files and the code that loads them.
+    Only file sizes and modification times are read, so checking a snapshot costs the same for any amount of data.
+    """
+    data_path = Path(data_path).resolve()
+    data_files = sorted(path for path in data_path.iterdir() if path.is_file() and path != snapshot_path)
+    code_files = [Path(module.__file__) for module in SNAPSHOT_CODE_MODULES]
+    signatures = [str(data_path)] + [file_signature(path) for path in data_files + code_files]
+    return hashlib.sha256('\n'.join(signatures).encode('utf-8')).hexdigest()
+
+
+def save_snapshot(repo: MemoryRepository, data_path: Path, snapshot_path: Path):
+    """
+    Write repo, with all of its indexes, to snapshot_path. The file is replaced atomically, so workers starting at
+    the same time read either the old or the new snapshot, never half of one.
+    :param repo: repository populated from data_path
+    :param data_path: the data the repository was populated from
+    :param snapshot_path: file to write
+    """
+    snapshot_path = Path(snapshot_path)
+    header = {'version': SNAPSHOT_VERSION, 'fingerprint': source_fingerprint(data_path, snapshot_path.resolve())}
+    payload = {'repo': repo, 'next_reading_list_id': ReadingList._NEXT_ID}
+    descriptor, temp_path = tempfile.mkstemp(dir=snapshot_path.resolve().parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as snapshot_file:
+            snapshot_file.write(SNAPSHOT_MAGIC)
+            pickle.dump(header, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(payload, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, snapshot_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_snapshot(data_path: Path, snapshot_path: Path) -> Optional[MemoryRepository]:
+    """
+    Read back a repository written by save_snapshot.
+    :return: the repository, or None when there is no snapshot or it does not match the current data and code
+    """
+    snapshot_path = Path(snapshot_path)
+    try:
+        snapshot = snapshot_path.read_bytes()
+    except FileNotFoundError:
+        return None
+    if not snapshot.startswith(SNAPSHOT_MAGIC):
+        return None
+    try:
+        # BytesIO shares the buffer of the bytes it is given, the snapshot is read from disk once and never copied
+        snapshot_file = io.BytesIO(snapshot)
+        snapshot_file.seek(len(SNAPSHOT_MAGIC))
+        header = pickle.load(snapshot_file)
+        if header.get('version') != SNAPSHOT_VERSION or \
+                header.get('fingerprint') != source_fingerprint(data_path, snapshot_path.resolve()):
+            return None
+        payload = pickle.load(snapshot_file)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # written by an older layout of the classes, rebuilt like a stale snapshot
+        return None
+    ReadingList._NEXT_ID = payload['next_reading_list_id']
+    return payload['repo']
+
+
+def populate_from_snapshot(data_path: Path, snapshot_path: Path, parse_workers: int = 1) -> MemoryRepository:
+    """
+    The memory repository for data_path, read from snapshot_path when the snapshot is current, otherwise populated
+    from the data files and saved to snapshot_path for the next start.
+    """
+    repo = load_snapshot(data_path, snapshot_path)
+    if repo is None:
+        repo = MemoryRepository()
+        populate(data_path, repo, parse_workers=parse_workers)
+        save_snapshot(repo, data_path, snapshot_path)
+    return repo
+
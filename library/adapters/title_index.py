@@ -0,0 +1,66 @@
+from typing import Dict, List, Set
+
+
+class TitleIndex:
+    """
+    Inverted n-gram index answering case-insensitive substring queries over titles.
+
+    Every title is broken into all of its 1, 2 and 3 character grams. A query of any length is answered by
+    intersecting the postings of its grams and confirming the surviving candidates with a substring check,
+    so results are exactly those of `query in title.lower()`.
+    """
+    MAX_GRAM_LENGTH = 3
+
+    def __init__(self):
+        self.__titles: Dict[int, str] = dict()
+        self.__positions: Dict[int, int] = dict()
+        self.__postings: Dict[str, Set[int]] = dict()
+        self.__next_position = 0
+
+    def add(self, item_id: int, title: str):
+        if item_id in self.__titles:
+            self.remove(item_id)
+        title = title.lower()
+        self.__titles[item_id] = title
+        self.__positions[item_id] = self.__next_position
+        self.__next_position += 1
+        for gram in self.__grams(title):
+            self.__postings.setdefault(gram, set()).add(item_id)
+
+    def remove(self, item_id: int):
+        title = self.__titles.pop(item_id, None)
+        if title is None:
+            return
+        del self.__positions[item_id]
+        for gram in self.__grams(title):
+            postings = self.__postings[gram]
+            postings.discard(item_id)
+            if not postings:
+                del self.__postings[gram]
+
+    def search(self, query: str) -> List[int]:
+        """
+        :param query: text to look for, case is ignored
+        :return: ids of titles containing query, in the order they were added
+        """
+        query = query.lower()
+        if query == "":
+            candidates = self.__titles.keys()
+        else:
+            grams = sorted(self.__grams(query, exact=True), key=lambda g: len(self.__postings.get(g, ())))
+            candidates = set(self.__postings.get(grams[0], ()))
+            for gram in grams[1:]:
+                if not candidates:
+                    break
+                candidates &= self.__postings.get(gram, set())
+        matches = [item_id for item_id in candidates if query in self.__titles[item_id]]
+        return sorted(matches, key=self.__positions.__getitem__)
+
+    def __len__(self):
+        return len(self.__titles)
+
+    def __grams(self, text: str, exact: bool = False) -> Set[str]:
+        """all grams of text, or when exact only the longest ones a query needs to be checked against"""
+        n = min(self.MAX_GRAM_LENGTH, len(text))
+        lengths = [n] if exact else range(1, n + 1)
+        return {text[i:i + length] for length in lengths for i in range(len(text) - length + 1)}
@@ -1,8 +1,11 @@
 # Configure blueprint.
 from math import floor, ceil
+from typing import NamedTuple, Optional
 
 from better_profanity import profanity
-from flask import Blueprint, request, render_template, abort, redirect, url_for, session, flash
+from flask import Blueprint, request, render_template, abort, redirect, url_for, session, flash, make_response, \
+    Response
+from markupsafe import Markup
 from flask_wtf import FlaskForm
 from wtforms import TextAreaField, HiddenField, SelectField, SubmitField
 from wtforms.validators import DataRequired, Length, ValidationError, InputRequired
@@ -11,18 +14,71 @@ from utils import str_to_int_list, log
 from .services import *
 import library.books.services as book_service
 import library.adapters.repository as repo
+from library.adapters.repository import REVIEW_ORDERS, REVIEWS_NEWEST_FIRST, REVIEWS_HIGHEST_RATING_FIRST
 import library.authentication.services as auth_service
 from ..authentication.authentication import login_required
 
 book_blueprint = Blueprint('book_bp', __name__)
 
 DEFAULT_NUMBER_OF_BOOKS_PER_PAGE = 6
+REVIEWS_PER_PAGE = 10
+REVIEW_ORDER_LABELS = ((REVIEWS_NEWEST_FIRST, 'Newest'), (REVIEWS_HIGHEST_RATING_FIRST, 'Highest rating'))
 NEW_LIST_OPTION_VALUE = -1
 
 
+class BookPage(NamedTuple):
+    """the parts of a book page that are the same for every visitor, cached by book id and page of reviews"""
+    title: str
+    details: Markup
+    reviews: Markup
+
+
+def render_book_page(book_id: int, sort: str = REVIEWS_NEWEST_FIRST, reviews_page: int = 1) -> BookPage:
+    book = get_book(book_id, repo.repo_instance)
+    reviews, reviews_page, number_of_pages = get_review_page_for_book(book_id, repo.repo_instance, sort,
+                                                                      reviews_page, REVIEWS_PER_PAGE)
+    return BookPage(book['title'], Markup(render_template('book/book_details.html', book=book)),
+                    Markup(render_template('book/book_reviews.html', reviews=reviews, book_id=book_id, sort=sort,
+                                           review_orders=REVIEW_ORDER_LABELS, current_page=reviews_page,
+                                           number_of_pages=number_of_pages)))
+
+
+def page_etag(key) -> Optional[str]:
+    """
+    strong ETag of the page under key (see services.get_page_tag), only for visitors who are not logged in
+    :return: None if the page is not validated: forms for logged in users carry CSRF tokens that expire, and flashed
+    messages are only shown once
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if 'user_name' in session or session.get('_flashes') or 'error' in request.args:
+        return None
+    return get_page_tag(key, repo.repo_instance)
+
+
+def not_modified(etag: Optional[str]) -> Optional[Response]:
+    """304 when the client holds the page tagged etag already, checked before anything is loaded or rendered"""
+    if etag is None or not request.if_none_match.contains(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def tagged(page: str, etag: Optional[str]) -> Response:
+    response = make_response(page)
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
 @book_blueprint.route('/book', methods=['GET', 'POST'])
 def single_book():
     book_id = request.args.get('id')
+    etag = page_etag(request.args.get('id', type=int))
+    response = not_modified(etag)
+    if response is not None:
+        return response
     # if tried to add a new list with empty name
     try:
         error_msgs = request.args.get('error').strip().split(',')
@@ -31,12 +87,22 @@ def single_book():
     except (NameError, AttributeError):
         pass
 
-    book = None
-    reviews = []
+    sort = request.args.get('sort', REVIEWS_NEWEST_FIRST)
+    if sort not in REVIEW_ORDERS:
+        sort = REVIEWS_NEWEST_FIRST
+    reviews_page = max(request.args.get('reviews_page', 1, int), 1)
+
+    page = None
     try:
         book_id = int(book_id)
-        book = get_book(book_id, repo.repo_instance)
-        reviews = get_reviews_for_book(book_id, repo.repo_instance)
+        page_cache = get_page_cache(repo.repo_instance)
+        if page_cache is None:
+            page = render_book_page(book_id, sort, reviews_page)
+        elif (sort, reviews_page) == (REVIEWS_NEWEST_FIRST, 1):
+            page = page_cache.get(book_id, lambda: render_book_page(book_id))
+        else:
+            page = page_cache.get(book_id, lambda: render_book_page(book_id, sort, reviews_page),
+                                  (sort, reviews_page))
     except NonExistentBookException as e:
         pass
     except ValueError as e:
@@ -56,14 +122,13 @@ def single_book():
         form.method.data = 'add'
         form.original_url.data = request.url
 
-    return render_template(
+    return tagged(render_template(
         'book/book.html',
-        book=book,
-        reviews=reviews,
+        page=page,
         should_have_form=should_have_form,
         form=form,
         handler_url=handler_url,
-    )
+    ), etag)
 
 
 @book_blueprint.route('/book/review', methods=['GET', 'POST'])
@@ -95,12 +160,25 @@ def add_review():
 @book_blueprint.route('/search_books_result', methods=['GET'])
 def display_book_list():
     # get args
-    book_ids = request.args.get('book_ids', [], str_to_int_list)
+    cursor = request.args.get('cursor')
     current_page = request.args.get('page', 1, int)
     books_per_page = request.args.get('bpp', DEFAULT_NUMBER_OF_BOOKS_PER_PAGE, int)
 
+    # search results are kept server-side under the cursor, an explicit id list is still accepted
+    if cursor is not None:
+        book_ids = get_book_ids_for_cursor(cursor, repo.repo_instance)
+        if book_ids is None:
+            abort(404)
+        list_args = {'cursor': cursor}
+    else:
+        book_ids = request.args.get('book_ids', [], str_to_int_list)
+        list_args = {'book_ids': ','.join([str(id_) for id_ in book_ids])}
+    etag = page_etag(book_list_page_key(cursor, book_ids, current_page, books_per_page, repo.repo_instance))
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
     # paginate
-    id_string = ','.join([str(id_) for id_ in book_ids])
     paginated_ids, number_of_pages, display_paging, shadow_first, shadow_last = paginate(book_ids, books_per_page,
                                                                                          current_page)
     should_disable_last = "disabled" if shadow_last else ""
@@ -109,18 +187,18 @@ def display_book_list():
     # books
     books = get_books(paginated_ids, repo.repo_instance)
 
-    return render_template(
+    return tagged(render_template(
         'book/book_list.html',
         books=books,
         total_results=len(book_ids),
         display_paging=display_paging,
         number_of_pages=number_of_pages,
-        id_string=id_string,
+        list_args=list_args,
         current_page=current_page,
         books_per_page=books_per_page,
         should_disable_last=should_disable_last,
         should_disable_first=should_disable_first
-    )
+    ), etag)
 
 
 @book_blueprint.route('/reading_list', methods=['GET'])
@@ -134,6 +212,11 @@ def display_reading_list():
 
     if not can_view_reading_list(reading_list, user):
         return redirect('home_bp.error')
+    # only once the list may be seen, a 304 would tell that a private list exists and whether it changed
+    etag = page_etag(reading_list_page_key(reading_list_id))
+    response = not_modified(etag)
+    if response is not None:
+        return response
 
     # paginate
     paginated_books, number_of_pages, display_paging, shadow_first, shadow_last = \
@@ -153,7 +236,7 @@ def display_reading_list():
     #     guest
         user = reading_list.shelve.user.user_name
 
-    return render_template(
+    return tagged(render_template(
         'book/reading_list.html',
         list=reading_list,
         books=paginated_books,
@@ -169,7 +252,7 @@ def display_reading_list():
         form=form,
         handler_url=url_for('book_bp.process_delete_book'),
         user=user
-    )
+    ), etag)
 
 
 @book_blueprint.route('/process-shelve', methods=['POST'])
@@ -198,6 +281,7 @@ def process_shelve_changes():
         elif form.method.data == 'del':
             reading_list.remove_book(book)
         repo.repo_instance.commit()
+        reading_lists_changed(shelve, repo.repo_instance)
         return redirect(url_for('book_bp.display_reading_list', id=reading_list.uid))
         # return redirect(form.original_url.data)
     error_msg = ','.join(form.new_name.errors)
@@ -211,26 +295,13 @@ def process_shelve_changes():
 @book_blueprint.route('/process_search_book', methods=['GET'])
 def process_search_book():
     search_method = request.args.get('method')
-    book_ids = []
-    if search_method == 'Title':
-        title = request.args.get('param')
-        book_ids = get_book_ids_by_title(title, repo.repo_instance)
-    elif search_method == 'Author':
-        author = request.args.get('param')
-        book_ids = get_book_ids_by_author_name(author, repo.repo_instance)
-    elif search_method == 'Publisher':
-        publisher = request.args.get('param')
-        book_ids = get_book_ids_by_publisher_name(publisher, repo.repo_instance)
-    elif search_method == 'Release Year':
-        yr = request.args.get('param', -1, int)
-        book_ids = get_book_ids_by_year(yr, repo.repo_instance, after_year=False)
-    elif search_method == 'Year since':
-        yr = request.args.get('param', -1, int)
-        book_ids = get_book_ids_by_year(yr, repo.repo_instance, after_year=True)
-    else:
+    if search_method not in SEARCH_METHODS:
         abort(404)
-    id_string = ','.join([str(id_) for id_ in book_ids])
-    return redirect(url_for('book_bp.display_book_list', book_ids=id_string, page=1))
+    search = {'method': search_method, 'param': request.args.get('param', '')}
+    if search_method == 'Keywords':
+        search.update((name, request.args[name]) for name in SEARCH_FILTERS if name in request.args)
+    cursor = make_search_cursor(search, repo.repo_instance)
+    return redirect(url_for('book_bp.display_book_list', cursor=cursor, page=1))
 
 
 @book_blueprint.route('/process_book_delete', methods=['POST'])
@@ -243,6 +314,7 @@ def process_delete_book():
         reading_list = repo.repo_instance.get_reading_list_by_id(list_id)
         reading_list.remove_book(book)
         repo.repo_instance.commit()
+        reading_lists_changed(reading_list.shelve, repo.repo_instance)
         return redirect(url_for('book_bp.display_reading_list', id=list_id))
     return redirect(url_for('home_bp.error'))
 
@@ -265,6 +337,7 @@ def change_is_public():
         list_ = repo.repo_instance.get_reading_list_by_id(list_id)
         list_.is_public = not list_.is_public
         repo.repo_instance.commit()
+        reading_lists_changed(list_.shelve, repo.repo_instance)
         return redirect(url_for('user_bp.get_profile'))
     return redirect(url_for('home_bp.error'))
 
@@ -0,0 +1,103 @@
+import re
+from heapq import nlargest
+from math import log
+from typing import Dict, List, Iterable, Optional
+
+from library.domain.model import Book
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class SearchIndex:
+    """
+    BM25 index over the title, description, author names and publisher name of books.
+
+    Each field is scored with BM25 on its own and the field scores are summed with FIELD_WEIGHTS, so a match in
+    the title counts for more than one in the description. Only books containing at least one query term are
+    scored, and the top k are picked with a heap instead of sorting every match.
+    """
+    K1 = 1.2
+    B = 0.75
+    FIELD_WEIGHTS = {
+        'title': 3.0,
+        'author': 2.0,
+        'publisher': 2.0,
+        'description': 1.0,
+    }
+
+    def __init__(self, books: Iterable[Book] = ()):
+        # field -> term -> book id -> term frequency
+        self.__postings: Dict[str, Dict[str, Dict[int, int]]] = {field: dict() for field in self.FIELD_WEIGHTS}
+        # field -> book id -> number of terms in the field
+        self.__lengths: Dict[str, Dict[int, int]] = {field: dict() for field in self.FIELD_WEIGHTS}
+        self.__total_lengths: Dict[str, int] = {field: 0 for field in self.FIELD_WEIGHTS}
+        # book id -> (catalog position, release year, ebook, average rating) for ordering and filtering
+        self.__attributes: Dict[int, tuple] = dict()
+        for book in books:
+            self.add(book)
+
+    def add(self, book: Book):
+        if book.book_id in self.__attributes:
+            return
+        self.__attributes[book.book_id] = (
+            len(self.__attributes), book.release_year, book.ebook, book.average_rating)
+        fields = {
+            'title': book.title,
+            'author': ' '.join(author.full_name for author in book.authors),
+            'publisher': book.publisher.name if book.publisher is not None else '',
+            'description': book.description,
+        }
+        for field, text in fields.items():
+            terms = tokenize(text)
+            self.__lengths[field][book.book_id] = len(terms)
+            self.__total_lengths[field] += len(terms)
+            postings = self.__postings[field]
+            for term in terms:
+                frequencies = postings.setdefault(term, dict())
+                frequencies[book.book_id] = frequencies.get(book.book_id, 0) + 1
+
+    def __len__(self):
+        return len(self.__attributes)
+
+    def search(self, query: str, k: int, start_year: Optional[int] = None, end_year: Optional[int] = None,
+               ebook: Optional[bool] = None, min_rating: Optional[float] = None) -> List[int]:
+        """
+        :param query: free text matched against every field, may be empty to only apply the filters
+        :param k: maximum number of ids to return
+        :param start_year, end_year: inclusive release year bounds, None leaves that side open
+        :param ebook: only return ebooks (True) or only printed books (False), None for both
+        :param min_rating: lowest accepted average rating
+        :return: ids of the k best matching books, best first; ties keep catalog order
+        """
+        def accepted(book_id):
+            _, year, is_ebook, rating = self.__attributes[book_id]
+            return (start_year is None or year >= start_year) and (end_year is None or year <= end_year) \
+                and (ebook is None or is_ebook == ebook) and (min_rating is None or rating >= min_rating)
+
+        terms = set(tokenize(query))
+        scores = self.__score(terms) if terms else dict.fromkeys(self.__attributes, 0.0)
+        candidates = (book_id for book_id in scores if accepted(book_id))
+        return nlargest(k, candidates, key=lambda book_id: (scores[book_id], -self.__attributes[book_id][0]))
+
+    def __score(self, terms) -> Dict[int, float]:
+        scores: Dict[int, float] = dict()
+        number_of_books = len(self.__attributes)
+        if number_of_books == 0:
+            return scores
+        for field, weight in self.FIELD_WEIGHTS.items():
+            lengths = self.__lengths[field]
+            average_length = self.__total_lengths[field] / number_of_books or 1
+            for term in terms:
+                frequencies = self.__postings[field].get(term)
+                if not frequencies:
+                    continue
+                idf = log(1 + (number_of_books - len(frequencies) + 0.5) / (len(frequencies) + 0.5))
+                for book_id, frequency in frequencies.items():
+                    norm = self.K1 * (1 - self.B + self.B * lengths[book_id] / average_length)
+                    scores[book_id] = scores.get(book_id, 0.0) + \
+                        weight * idf * frequency * (self.K1 + 1) / (frequency + norm)
+        return scores
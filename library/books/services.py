@@ -1,6 +1,30 @@
+import base64
+import binascii
+import json
+from itertools import islice
+from math import ceil
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+from weakref import WeakKeyDictionary
+
 from library.adapters.repository import AbstractRepository
+from library.books.search_index import SearchIndex
+from library.cache import LRUCache, MemoryStore, SqliteStore, VersionedCache
 from library.domain.model import *
 
+SEARCH_RESULT_LIMIT = 60
+SEARCH_METHODS = ('Title', 'Author', 'Publisher', 'Release Year', 'Year since', 'Keywords')
+SEARCH_FILTERS = ('year_from', 'year_to', 'ebook', 'min_rating')
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 10 * 60
+PAGE_CACHE_SIZE = 256
+# book pages are cached by book id, search results only change when the app is started with other data
+# one ranked search index and one search result cache per repository, see get_search_index and get_search_results
+_search_indexes = WeakKeyDictionary()
+_search_result_caches = WeakKeyDictionary()
+# rendered book pages and the version stamps of the pages per repository, see get_page_cache
+_page_caches = WeakKeyDictionary()
+
 
 class NonExistentBookException(Exception):
     pass
@@ -28,6 +52,10 @@ def add_review(book_id: int, rating: int, review_text: str, user_name: str, repo
     review = Review(book, review_text, rating)
     user.add_review(review)
     repo.add_review(review, user)
+    # only once the review is stored, a page rendered before that must not be cached as the new version
+    page_cache = get_page_cache(repo)
+    if page_cache is not None:
+        page_cache.bump(book_id)
 
 
 def get_book(book_id: int, repo: AbstractRepository):
@@ -47,7 +75,12 @@ def get_book_ids_by_year(year: int, repo: AbstractRepository, after_year: bool =
     """if after_year is set to false, this method will return books published in the year"""
     if not Checks.check_int(year):
         return []
-    books = repo.get_books_after_year_inclusive(year) if after_year else repo.get_books_by_year(year)
+    return get_book_ids_in_year_range(year, None if after_year else year, repo)
+
+
+def get_book_ids_in_year_range(start_year: Optional[int], end_year: Optional[int], repo: AbstractRepository):
+    """both bounds are inclusive, None leaves that side of the range open"""
+    books = repo.get_books_in_year_range(start_year, end_year)
     return get_ids_for_books(books)
 
 
@@ -74,8 +107,7 @@ def get_book_ids_by_author(author: Author, repo: AbstractRepository):
 
 
 def get_book_ids_by_publisher_name(publisher_name: str, repo: AbstractRepository):
-    publishers = repo.get_publishers()
-    publisher = next((publisher for publisher in publishers if publisher.name.lower() == publisher_name.lower()), None)
+    publisher = repo.get_publisher_by_name(publisher_name)
     if not publisher:
         return []
     return get_book_ids_by_publisher(publisher, repo)
@@ -86,6 +118,111 @@ def get_book_ids_by_publisher(publisher: Publisher, repo: AbstractRepository):
     return book_ids
 
 
+def get_search_index(repo: AbstractRepository) -> SearchIndex:
+    """the index is built on first use and rebuilt once a book is added or changed (see get_books_version)"""
+    version = repo.get_books_version()
+    index, indexed_version = _search_indexes.get(repo, (None, None))
+    if index is None or indexed_version != version:
+        index = SearchIndex(repo.get_books_in_year_range(None, None))
+        _search_indexes[repo] = index, version
+    return index
+
+
+def search_books(query: str, repo: AbstractRepository, k: int = SEARCH_RESULT_LIMIT,
+                 start_year: Optional[int] = None, end_year: Optional[int] = None,
+                 ebook: Optional[bool] = None, min_rating: Optional[float] = None) -> List[int]:
+    """
+    rank books by how well their title, description, authors and publisher match query
+    :return: ids of at most k books passing the filters, best match first
+    """
+    return get_search_index(repo).search(query, k, start_year, end_year, ebook, min_rating)
+
+
+def _parse(value: Optional[str], type_, default=None):
+    try:
+        return default if value is None else type_(value)
+    except ValueError:
+        return default
+
+
+def search_book_ids(search: Dict[str, str], repo: AbstractRepository) -> List[int]:
+    """
+    run a search as submitted by the search form
+    :param search: 'method' (one of SEARCH_METHODS), 'param' and, for keyword searches, any of SEARCH_FILTERS
+    :return: ids of the matching books
+    """
+    method = search.get('method')
+    param = search.get('param', '')
+    if method == 'Title':
+        return get_book_ids_by_title(param, repo)
+    elif method == 'Author':
+        return get_book_ids_by_author_name(param, repo)
+    elif method == 'Publisher':
+        return get_book_ids_by_publisher_name(param, repo)
+    elif method == 'Release Year':
+        return get_book_ids_by_year(_parse(param, int, -1), repo, after_year=False)
+    elif method == 'Year since':
+        return get_book_ids_by_year(_parse(param, int, -1), repo, after_year=True)
+    elif method == 'Keywords':
+        return search_books(
+            param,
+            repo,
+            start_year=_parse(search.get('year_from'), int),
+            end_year=_parse(search.get('year_to'), int),
+            ebook=_parse(search.get('ebook'), lambda s: s.lower() == 'true'),
+            min_rating=_parse(search.get('min_rating'), float),
+        )
+    raise ValueError("Unknown search method")
+
+
+def encode_search_cursor(search: Dict[str, str]) -> str:
+    """opaque token for a search, it carries the search itself so the results can be recomputed at any time"""
+    payload = json.dumps(search, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_search_cursor(cursor: str) -> Optional[Dict[str, str]]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        search = json.loads(payload.decode('utf-8'))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(search, dict) or search.get('method') not in SEARCH_METHODS:
+        return None
+    return search
+
+
+def get_search_results(repo: AbstractRepository) -> LRUCache:
+    cache = _search_result_caches.get(repo)
+    if cache is None:
+        cache = LRUCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        _search_result_caches[repo] = cache
+    return cache
+
+
+def make_search_cursor(search: Dict[str, str], repo: AbstractRepository) -> str:
+    """run the search and keep its results server-side under the returned cursor"""
+    cursor = encode_search_cursor(search)
+    get_search_results(repo).put(cursor, tuple(search_book_ids(search, repo)))
+    return cursor
+
+
+def get_book_ids_for_cursor(cursor: str, repo: AbstractRepository) -> Optional[Tuple[int, ...]]:
+    """
+    results of the search behind cursor, recomputed when they have been evicted from the cache
+    :return: None if cursor is not a valid cursor
+    """
+    results = get_search_results(repo)
+    book_ids = results.get(cursor)
+    if book_ids is None:
+        search = decode_search_cursor(cursor)
+        if search is None:
+            return None
+        book_ids = tuple(search_book_ids(search, repo))
+        results.put(cursor, book_ids)
+    return book_ids
+
+
 def get_reviews_for_book(book_id: int, repo: AbstractRepository):
     book = repo.get_book(book_id)
     if book is None:
@@ -94,6 +231,72 @@ def get_reviews_for_book(book_id: int, repo: AbstractRepository):
     return [review_to_dict(review) for review in reviews]
 
 
+def get_review_page_for_book(book_id: int, repo: AbstractRepository, order: str, page: int,
+                             reviews_per_page: int) -> Tuple[List[Dict], int, int]:
+    """
+    one page of the reviews of a book, only that page is loaded however many reviews the book has
+    :param order: one of repository.REVIEW_ORDERS
+    :param page: starting from 1, pages past the last one give the last one
+    :return: the reviews on the page, the page and the number of pages
+    """
+    book = repo.get_book(book_id)
+    if book is None:
+        raise NonExistentBookException
+    number_of_pages = max(1, ceil(repo.get_number_of_reviews_for_book(book) / reviews_per_page))
+    page = min(max(page, 1), number_of_pages)
+    reviews = repo.get_reviews_for_book(book, order, (page - 1) * reviews_per_page, reviews_per_page)
+    return [review_to_dict(review) for review in reviews], page, number_of_pages
+
+
+def get_page_cache(repo: AbstractRepository) -> Optional[VersionedCache]:
+    """
+    the parts of book pages shown to everyone by book id, and the versions of the other pages (see get_page_tag),
+    kept in this process unless set_page_store says otherwise
+    :return: None if pages are not cached
+    """
+    if repo not in _page_caches:
+        _page_caches[repo] = VersionedCache(MemoryStore(PAGE_CACHE_SIZE))
+    return _page_caches[repo]
+
+
+def set_page_store(repo: AbstractRepository, store: Union[MemoryStore, SqliteStore, None]):
+    """keep the book pages of repo in store, None to stop caching them"""
+    _page_caches[repo] = None if store is None else VersionedCache(store)
+
+
+def reading_list_page_key(reading_list_id: int) -> tuple:
+    return 'reading_list', reading_list_id
+
+
+def book_list_page_key(cursor: Optional[str], book_ids: List[int], page: int, books_per_page: int,
+                       repo: AbstractRepository) -> tuple:
+    """
+    the books of a list page may change without a bump, so the key tells the list, the page, and the version of the
+    books it was rendered from
+    """
+    return 'book_list', cursor, tuple(book_ids), page, books_per_page, repo.get_books_version()
+
+
+def get_page_tag(key, repo: AbstractRepository) -> Optional[str]:
+    """
+    version stamp of the page under key, read without the repository
+    :return: None if pages are not cached, their versions are not kept either
+    """
+    page_cache = get_page_cache(repo)
+    return None if page_cache is None else page_cache.tag(key)
+
+
+def reading_lists_changed(shelve: Shelve, repo: AbstractRepository):
+    """
+    to call once the reading lists of shelve changed, moving a book to a bundled list takes it out of the others
+    so they all get a new version
+    """
+    page_cache = get_page_cache(repo)
+    if page_cache is not None:
+        for reading_list in shelve.reading_lists:
+            page_cache.bump(reading_list_page_key(reading_list.uid))
+
+
 def can_view_reading_list(reading_list: ReadingList, user: User) -> bool:
     # check for validity
     if reading_list is None:
@@ -128,6 +331,9 @@ def remove_reading_list(id: int, repo: AbstractRepository):
     if reading_list is not None and not isinstance(reading_list, BundledReadingList):
         repo.remove_reading_list(reading_list.uid)
         reading_list.shelve.remove_reading_list(reading_list)
+        page_cache = get_page_cache(repo)
+        if page_cache is not None:
+            page_cache.bump(reading_list_page_key(reading_list.uid))
 
 ##########################################
 # Convert objects to dict
@@ -157,13 +363,23 @@ def author_to_dict_full(author: Author):
     }
 
 
-def book_to_dict(book: Book):
+def book_to_dict(book: Book) -> Mapping:
+    """
+    read-only, and kept with the book until one of its fields changes (see Book.serialized): memory repository books
+    serve every request, database repository ones the session that loaded them
+    """
+    if book.serialized is None:
+        book.serialized = MappingProxyType(make_book_dict(book))
+    return book.serialized
+
+
+def make_book_dict(book: Book) -> dict:
     return {
         'id': book.book_id,
         'ebook': book.ebook,
         'num_pages': book.num_pages,
         'title': book.title,
-        'publisher': publisher_to_dict(book.publisher),
+        'publisher': MappingProxyType(publisher_to_dict(book.publisher)),
         'description': book.description,
         'release_year': book.release_year,
         'average_rating': book.average_rating,
@@ -171,7 +387,7 @@ def book_to_dict(book: Book):
         'text_reviews_count': book.text_reviews_count,
         'image_url': book.img_url,
         'website_url': book.website_url,
-        'authors': [author_to_dict_simple(author) for author in book.authors],
+        'authors': tuple(MappingProxyType(author_to_dict_simple(author)) for author in book.authors),
     }
 
 
@@ -184,21 +400,35 @@ def review_to_dict(review: Review):
     }
 
 
-def reading_list_to_dict(reading_list: ReadingList):
+def reading_list_to_dict(reading_list: ReadingList, max_books: Optional[int] = None,
+                         repo: Optional[AbstractRepository] = None):
+    """
+    :param max_books: how many of the last books added to include, all of them if None. The others are left to the
+    pages of display_reading_list, size still counts them
+    :param repo: where the books and size are read with max_books, without loading the other books of the list
+    """
+    if max_books is not None and repo is not None:
+        books = repo.get_last_books_of_reading_list(reading_list, max_books)
+        size = repo.get_reading_list_size(reading_list)
+    else:
+        books = islice(reading_list.books, max_books)
+        size = len(reading_list)
     return {
         'is_permanent': isinstance(reading_list, BundledReadingList),
         'id': reading_list.uid,
         'name': reading_list.name,
         'is_public': reading_list.is_public,
-        'books': [book_to_dict(book) for book in reading_list.books],
-        'size': len(reading_list)
+        'books': [book_to_dict(book) for book in books],
+        'size': size
     }
 
 
-def shelve_to_dict(shelve: Shelve):
+def shelve_to_dict(shelve: Shelve, max_books_per_list: Optional[int] = None,
+                   repo: Optional[AbstractRepository] = None):
     return {
         'user': shelve.user.user_name,
-        'lists': [reading_list_to_dict(readings_list) for readings_list in shelve.reading_lists]
+        'lists': [reading_list_to_dict(readings_list, max_books_per_list, repo)
+                  for readings_list in shelve.reading_lists]
     }
 
 
@@ -0,0 +1,220 @@
+import hashlib
+import pickle
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock, local
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+
+class LRUCache:
+    """
+    Bounded in-process cache, the least recently used entry is evicted once max_size is reached.
+
+    When ttl is given, entries also expire ttl seconds after they were stored. The cache is shared by the threads
+    serving requests, so every operation holds a lock.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        if max_size < 1:
+            raise ValueError("Invalid cache size")
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__clock = clock
+        self.__entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self.__clock():
+                del self.__entries[key]
+                return default
+            self.__entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        expires_at = None if self.__ttl is None else self.__clock() + self.__ttl
+        with self.__lock:
+            self.__entries[key] = (expires_at, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key, self) is not self
+
+
+def new_generation() -> str:
+    """
+    tags of a store start with its generation: versions start over with the data when the app is restarted on a new
+    store, or on one cleared, and tags from before must not match
+    """
+    return uuid.uuid4().hex[:12]
+
+
+class MemoryStore:
+    """
+    Store of a VersionedCache kept in this process: values in an LRUCache, versions in a dict. Versions are never
+    evicted, a key whose version was forgotten would start over and could match values stored before.
+
+    The generation is given by the processes populated from the same data, so that their tags agree, a new one
+    otherwise.
+    """
+
+    def __init__(self, max_size: int = 256, generation: Optional[str] = None):
+        self.__values = LRUCache(max_size)
+        self.__versions: Dict[Hashable, int] = dict()
+        self.__generation = generation if generation is not None else new_generation()
+        self.__lock = Lock()
+
+    def get(self, key: Hashable) -> Any:
+        return self.__values.get(key)
+
+    def put(self, key: Hashable, value: Any):
+        self.__values.put(key, value)
+
+    def delete(self, key: Hashable):
+        self.__values.delete(key)
+
+    def version(self, key: Hashable) -> int:
+        return self.__versions.get(key, 0)
+
+    def bump(self, key: Hashable):
+        with self.__lock:
+            self.__versions[key] = self.__versions.get(key, 0) + 1
+
+    def generation(self) -> str:
+        return self.__generation
+
+    def clear(self):
+        """forget the values and start a new generation, versions are kept so they never go back to one already used"""
+        self.__values.clear()
+        self.__generation = new_generation()
+
+
+class SqliteStore:
+    """
+    Store of a VersionedCache in an SQLite file, shared by the worker processes serving the same database on one
+    machine. Values are pickled, keys are stored by their repr so they have to be ints, strings or tuples of them.
+    Once max_size values are stored, the ones stored first are evicted.
+    """
+
+    def __init__(self, path: Union[str, Path], max_size: int = 1024):
+        if max_size < 1:
+            raise ValueError("Invalid cache size")
+        self.__path = str(path)
+        self.__max_size = max_size
+        # sqlite3 connections cannot be shared between threads
+        self.__local = local()
+        connection = self.__connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS cache_value (key TEXT PRIMARY KEY, value BLOB NOT NULL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS cache_version (key TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        connection.execute("INSERT OR IGNORE INTO cache_meta (key, value) VALUES ('generation', ?)",
+                           (new_generation(), ))
+
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            # autocommit, every statement is a transaction of its own
+            connection = sqlite3.connect(self.__path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.__local.connection = connection
+        return connection
+
+    def get(self, key: Hashable) -> Any:
+        row = self.__connection().execute('SELECT value FROM cache_value WHERE key = ?', (repr(key), )).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, key: Hashable, value: Any):
+        connection = self.__connection()
+        connection.execute('INSERT OR REPLACE INTO cache_value (key, value) VALUES (?, ?)',
+                           (repr(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        # replaced rows get a new rowid, rowids go up in the order the values were stored
+        connection.execute('DELETE FROM cache_value WHERE rowid <= '
+                           '(SELECT rowid FROM cache_value ORDER BY rowid DESC LIMIT 1 OFFSET ?)', (self.__max_size, ))
+
+    def delete(self, key: Hashable):
+        self.__connection().execute('DELETE FROM cache_value WHERE key = ?', (repr(key), ))
+
+    def version(self, key: Hashable) -> int:
+        row = self.__connection().execute('SELECT version FROM cache_version WHERE key = ?', (repr(key), )).fetchone()
+        return 0 if row is None else row[0]
+
+    def bump(self, key: Hashable):
+        self.__connection().execute('INSERT INTO cache_version (key, version) VALUES (?, 1) '
+                                    'ON CONFLICT (key) DO UPDATE SET version = version + 1', (repr(key), ))
+
+    def generation(self) -> str:
+        return self.__connection().execute("SELECT value FROM cache_meta WHERE key = 'generation'").fetchone()[0]
+
+    def clear(self, generation: Optional[str] = None):
+        """
+        forget the values and start generation, a new one if None, versions are kept so they never go back to one
+        already used
+        """
+        connection = self.__connection()
+        connection.execute('DELETE FROM cache_value')
+        connection.execute("UPDATE cache_meta SET value = ? WHERE key = 'generation'",
+                           (generation if generation is not None else new_generation(), ))
+
+
+class VersionedCache:
+    """
+    Values computed from the current state of an object, by a key identifying the object (e.g. rendered book pages
+    by book id). bump(key) once the object changed: values are stored under the version current when they started
+    being computed, so one computed from the state before the change is never returned after it.
+
+    The store is pluggable, a MemoryStore for one process or a SqliteStore shared by the processes of one machine.
+    """
+
+    def __init__(self, store: Union[MemoryStore, SqliteStore, None] = None):
+        self.__store = store if store is not None else MemoryStore()
+
+    def get(self, key: Hashable, compute: Callable[[], Any], variant: Hashable = None) -> Any:
+        """
+        :param compute: called to make the value when it is not stored for the current version of key
+        :param variant: tells apart values of the same object (e.g. the pages of its reviews), the ones of older
+        versions are left to be evicted
+        """
+        entry_key = (key, self.__store.version(key))
+        if variant is not None:
+            entry_key += (variant,)
+        value = self.__store.get(entry_key)
+        if value is None:
+            value = compute()
+            self.__store.put(entry_key, value)
+        return value
+
+    def tag(self, key: Hashable) -> str:
+        """
+        validator of the current version of key (e.g. an ETag), different for every key, after every bump and every
+        clear of the store, the same in all the processes sharing the store
+        """
+        key_digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        return '%s-%s-%d' % (self.__store.generation(), key_digest, self.__store.version(key))
+
+    def bump(self, key: Hashable):
+        version = self.__store.version(key)
+        self.__store.bump(key)
+        self.__store.delete((key, version))
+
+    def clear(self):
+        self.__store.clear()
@@ -1,17 +1,159 @@
 from datetime import datetime
-from itertools import permutations
-from typing import List, Dict, Optional, Union
+from itertools import islice, permutations
+from typing import List, Dict, Iterable, Mapping, Optional, Union
 
-from utils import Checks
+from utils import Checks, insort_by_key
 
 
-class Reviewed:
+class OrderedSet:
+    """
+    Set that keeps its items in insertion order, backed by a dict so add, remove and membership tests are O(1).
+    It compares equal to a list holding the same items in the same order, and can be sliced like one (which walks
+    the set once). Positions cannot be looked up on their own, a loop doing so would walk the set every time.
+    """
+    # tells SQLAlchemy to instrument it like a set
+    __emulates__ = set
+
+    def __init__(self, items: Iterable = ()):
+        self.__items = dict.fromkeys(items)
+
+    def add(self, item):
+        self.__items[item] = None
+
+    def remove(self, item):
+        del self.__items[item]
+
+    def discard(self, item):
+        self.__items.pop(item, None)
+
+    def __contains__(self, item) -> bool:
+        return item in self.__items
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __reversed__(self):
+        return reversed(self.__items)
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __getitem__(self, index: slice) -> list:
+        return slice_items(self, index)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, OrderedSet, ReversedView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class ReversedView:
+    """read-only view of an OrderedSet from the last item added to the first, nothing is copied"""
+
+    def __init__(self, items: OrderedSet):
+        self.__items = items
+
+    def __contains__(self, item) -> bool:
+        return item in self.__items
+
+    def __iter__(self):
+        return reversed(self.__items)
+
+    def __reversed__(self):
+        return iter(self.__items)
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __getitem__(self, index: slice) -> list:
+        return slice_items(self, index)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, OrderedSet, ReversedView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+def slice_items(items: Union[OrderedSet, ReversedView], index: slice) -> list:
+    """list slicing for the ordered sets, stopping at the end of the slice"""
+    if not isinstance(index, slice):
+        raise TypeError("ordered sets can only be sliced, iterate over them or make a list of them once")
+    start, stop, step = index.indices(len(items))
+    if step < 0:
+        return list(items)[index]
+    return list(islice(items, start, stop, step))
+
+
+class CompactState:
+    """
+    The domain classes list their attributes in __slots__, so objects of the memory repository have no dict of
+    their own. __dict__ stays among the slots for SQLAlchemy: mapping a class (see adapters/orm.py) replaces the slots
+    of the mapped attributes by its own descriptors, which keep the values in the instance __dict__. Every class
+    deriving from this one is mapped or a base of mapped ones, so none can drop it. The dict is only made once an
+    attribute outside the slots is set, which only SQLAlchemy does, so an object of the memory repository only pays
+    for the empty pointer to it. Since Python 3.11 objects share the keys of their dicts and keep the values inline,
+    so the slots save less there than on earlier versions; most of the memory of a book is its strings.
+
+    Objects are pickled as the values of their slots, set again attribute by attribute when unpickled. The attributes
+    __hash__ needs come first, coauthors and readers refer back to the object while its state is read and it has to
+    go in their sets by then.
+    """
+    __slots__ = ('__dict__', '__weakref__')
+    _HASH_ATTRIBUTES = ()
+    # names of the slots of the class and its bases, as stored
+    _STATE_ATTRIBUTES = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # private slot names are mangled like the attributes assigned in the class
+        prefix = '_' + cls.__name__.lstrip('_')
+        cls._STATE_ATTRIBUTES = cls._STATE_ATTRIBUTES + tuple(
+            prefix + name if name.startswith('__') and not name.endswith('__') else name
+            for name in cls.__dict__.get('__slots__', ()))
+
+    def __getstate__(self) -> dict:
+        state = dict()
+        for name in self._STATE_ATTRIBUTES:
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                # never set, e.g. attributes of objects loaded by SQLAlchemy that are not mapped
+                pass
+        return state
+
+    def __reduce_ex__(self, protocol):
+        state = self.__getstate__()
+        return restore_compact_state, (self.__class__, {name: state[name] for name in self._HASH_ATTRIBUTES}), state
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+def restore_compact_state(cls: type, hash_state: dict) -> CompactState:
+    restored = cls.__new__(cls)
+    restored.__setstate__(hash_state)
+    return restored
+
+
+class Reviewed(CompactState):
+    __slots__ = ('__average_rating', '__text_reviews_count', '__rating_count')
 
     def __init__(self):
         self.__average_rating = 0
         self.__text_reviews_count = 0
         self.__rating_count = 0
 
+    def _changed(self):
+        """called by the setters once they changed a field"""
+        pass
+
     @property
     def text_reviews_count(self) -> int:
         return self.__text_reviews_count
@@ -20,6 +162,7 @@ class Reviewed:
     def text_reviews_count(self, ct):
         if Checks.check_int(ct):
             self.__text_reviews_count = ct
+            self._changed()
         else:
             raise ValueError("Invalid count")
 
@@ -31,6 +174,7 @@ class Reviewed:
     def ratings_count(self, ct):
         if Checks.check_int(ct):
             self.__rating_count = ct
+            self._changed()
         else:
             raise ValueError("Invalid count")
 
@@ -42,11 +186,14 @@ class Reviewed:
     def average_rating(self, rating):
         if isinstance(rating, float) and 0 <= rating <= 5:
             self.__average_rating = rating
+            self._changed()
         else:
             raise ValueError("Invalid rating")
 
 
 class Author(Reviewed):
+    __slots__ = ('__id', 'full_name', 'coauthors')
+    _HASH_ATTRIBUTES = ('_Author__id', )
 
     def __init__(self, author_id: int, author_full_name: str):
         super().__init__()
@@ -57,7 +204,7 @@ class Author(Reviewed):
 
         self.__id = author_id
         self.full_name = author_full_name.strip()
-        self.coauthors = []
+        self.coauthors: OrderedSet = OrderedSet()
 
     @property
     def unique_id(self):
@@ -82,14 +229,17 @@ class Author(Reviewed):
         if not isinstance(coauthor, Author):
             raise ValueError("Invalid author")
         if coauthor not in self.coauthors and coauthor != self:
-            self.coauthors.append(coauthor)
+            self.coauthors.add(coauthor)
             # coauthor.coauthors.append(self)
 
     def check_if_this_author_coauthored_with(self, author: 'Author') -> bool:
         return author in self.coauthors
 
 
-class Publisher:
+class Publisher(CompactState):
+    __slots__ = ('__name', )
+    _HASH_ATTRIBUTES = ('_Publisher__name', )
+
     def __init__(self, publisher_name: str):
         self.__name = publisher_name.strip() if Checks.check_str(publisher_name) else "N/A"
 
@@ -118,6 +268,11 @@ class Publisher:
 
 
 class Book(Reviewed):
+    __slots__ = ('__id', '__title', '__description', '__publisher', '__authors', '__release_year', '__ebook',
+                 '__num_pages', '__reviews', '__img_url', '__website_url', '__serialized')
+    _HASH_ATTRIBUTES = ('_Book__id', )
+    # number of times a field of any book changed through its setters, see MemoryRepository.get_books_version
+    changes = 0
 
     def __init__(self, book_id: int, title: str):
         super().__init__()
@@ -140,6 +295,33 @@ class Book(Reviewed):
         self.__reviews: List[Review] = []
         self.__img_url = ""
         self.__website_url = ""
+        self.__serialized: Optional[Mapping] = None
+
+    @property
+    def serialized(self) -> Optional[Mapping]:
+        """what services.book_to_dict made of the book, None again once a field changed"""
+        try:
+            return self.__serialized
+        except AttributeError:
+            # books loaded by SQLAlchemy do not go through __init__
+            return None
+
+    @serialized.setter
+    def serialized(self, serialized: Mapping):
+        self.__serialized = serialized
+
+    def forget_serialized(self):
+        self.__serialized = None
+
+    def _changed(self):
+        self.forget_serialized()
+        Book.changes += 1
+
+    def __getstate__(self):
+        # the mapping proxies of the serialised book cannot be pickled, it is made again when needed
+        state = super().__getstate__()
+        state['_Book__serialized'] = None
+        return state
 
     @property
     def img_url(self) -> str:
@@ -148,6 +330,7 @@ class Book(Reviewed):
     @img_url.setter
     def img_url(self, img_url):
         self.__img_url = img_url.strip()
+        self._changed()
 
     @property
     def website_url(self) -> str:
@@ -156,6 +339,7 @@ class Book(Reviewed):
     @website_url.setter
     def website_url(self, website_url):
         self.__website_url = website_url.strip()
+        self._changed()
 
     @property
     def book_id(self):
@@ -168,7 +352,8 @@ class Book(Reviewed):
     @title.setter
     def title(self, title):
         if Checks.check_str(title):
-            self.__description = title.strip()
+            self.__title = title.strip()
+            self._changed()
         else:
             raise ValueError("Invalid title")
 
@@ -180,6 +365,7 @@ class Book(Reviewed):
     def description(self, description):
         if Checks.check_str(description):
             self.__description = description.strip()
+            self._changed()
         else:
             raise ValueError("Invalid description")
 
@@ -191,6 +377,7 @@ class Book(Reviewed):
     def publisher(self, publisher: Publisher):
         if isinstance(publisher, Publisher):
             self.__publisher = publisher
+            self._changed()
 
     @property
     def authors(self):
@@ -200,6 +387,7 @@ class Book(Reviewed):
     def authors(self, authors: List[Author]):
         if isinstance(authors, List) and len(authors) > 0:
             self.__authors = authors
+            self._changed()
 
     @property
     def release_year(self):
@@ -209,6 +397,7 @@ class Book(Reviewed):
     def release_year(self, year):
         if Checks.check_int(year):
             self.__release_year = year
+            self._changed()
         else:
             raise ValueError("Invalid year")
 
@@ -220,6 +409,7 @@ class Book(Reviewed):
     def ebook(self, ebook: bool):
         if isinstance(ebook, int):
             self.__ebook = not not ebook
+            self._changed()
 
     @property
     def reviews(self):
@@ -247,14 +437,17 @@ class Book(Reviewed):
         return hash(self.__id)
 
     def add_author(self, author: Author) -> None:
+        """the author becomes a coauthor of the authors already on the book"""
         if isinstance(author, Author) and author not in self.__authors:
-            for existing_author in self.authors:
+            for existing_author in self.__authors:
                 author.add_coauthor(existing_author)
             self.__authors.append(author)
+            self._changed()
 
     def remove_author(self, author: Author) -> None:
         if author in self.authors:
             self.__authors.remove(author)
+            self._changed()
 
     @property
     def num_pages(self):
@@ -266,9 +459,12 @@ class Book(Reviewed):
             self.__num_pages = value
         else:
             self.__num_pages = 0
+        self._changed()
+
 
+class Review(CompactState):
+    __slots__ = ('__book', '__text', '__rating', '__timestamp', '__user')
 
-class Review:
     def __init__(self, book: Book, text: str, rating: int, timestamp: datetime = datetime.now(), user=None):
         if not isinstance(book, Book):
             book = None
@@ -381,7 +577,10 @@ class BooksInventory:
         return len(self.__title_book_table.keys())
 
 
-class ReadingList:
+class ReadingList(CompactState):
+    __slots__ = ('__uid', '__name', '__shelve', '__is_public', '__books')
+    _HASH_ATTRIBUTES = ('_ReadingList__uid', )
+
     TO_READ_LIST = "To read"
     CURRENTLY_READING = "Currently reading"
     READ = "Read"
@@ -406,7 +605,7 @@ class ReadingList:
         self.__name = name
         self.__shelve = shelve
         self.__is_public = is_public
-        self.__books: List[Book] = []
+        self.__books: OrderedSet = OrderedSet()
 
     @property
     def name(self):
@@ -437,18 +636,16 @@ class ReadingList:
             self.__is_public = value
 
     @property
-    def books(self):
+    def books(self) -> ReversedView:
         """get books, last in first out"""
-        return list(reversed(self.__books))
+        return ReversedView(self.__books)
 
     def add_book(self, book: Book):
         if isinstance(book, Book):
-            if book not in self.__books:
-                self.__books.append(book)
+            self.__books.add(book)
 
     def remove_book(self, book: Book):
-        if book in self.__books:
-            self.__books.remove(book)
+        self.__books.discard(book)
 
     @property
     def uid(self):
@@ -473,6 +670,9 @@ class ReadingList:
     def __len__(self) -> int:
         return len(self.__books)
 
+    def __contains__(self, book) -> bool:
+        return book in self.__books
+
     def __iter__(self):
         return self.books.__iter__()
 
@@ -481,6 +681,7 @@ class BundledReadingList(ReadingList):
     """
     Book can be appended but will be removed from any bundled reading list if already present in there.
     """
+    __slots__ = ('__bundled_reading_lists', )
 
     def __init__(self, name: str, shelve: 'Shelve', uid: int = -1, is_public: bool = False):
         super().__init__(name, shelve, uid, is_public)
@@ -503,6 +704,8 @@ class BundledReadingList(ReadingList):
 
 
 class ReadReadingList(BundledReadingList):
+    __slots__ = ()
+
     def add_book(self, book: Book):
         if isinstance(book, Book):
             if self.shelve.user is not None:
@@ -513,7 +716,9 @@ class ReadReadingList(BundledReadingList):
         return super().__repr__()
 
 
-class Shelve:
+class Shelve(CompactState):
+    __slots__ = ('__reading_lists', '__to_read', '__currently_reading', '__read', '__user')
+
     def __init__(self, user: 'User' = None):
         self.__reading_lists: List[ReadingList] = []
 
@@ -582,7 +787,10 @@ class Shelve:
         return iter(self.reading_lists)
 
 
-class User:
+class User(CompactState):
+    __slots__ = ('__user_name', '__password', '__read_books', '__reviews', '__pages_read', '__shelve')
+    _HASH_ATTRIBUTES = ('_User__user_name', )
+
     def __init__(self, user_name: str, password: str, pages_read=0, shelve=None):
         if not Checks.check_str(user_name):
             user_name = None
@@ -595,7 +803,8 @@ class User:
             shelve.post_init()
         self.__user_name: Optional[str] = None if user_name is None else user_name.strip().lower()
         self.__password: Optional[str] = password
-        self.__read_books: List[Book] = []
+        self.__read_books: OrderedSet = OrderedSet()
+        # oldest first
         self.__reviews: List[Review] = []
         self.__pages_read: int = pages_read
         self.__shelve = shelve
@@ -641,7 +850,7 @@ class User:
             raise ValueError("Invalid book")
         if book in self.__read_books:
             return
-        self.__read_books.append(book)
+        self.__read_books.add(book)
         self.__pages_read += book.num_pages if Checks.check_int(book.num_pages) else 0
 
     def add_review(self, review: Review) -> None:
@@ -650,7 +859,12 @@ class User:
         if review in self.__reviews:
             return
         review.user = self
-        self.__reviews.append(review)
+        # a new review is usually the most recent one and goes at the end
+        insort_by_key(self.__reviews, review, Review.timestamp.fget)
+
+    def get_recent_reviews(self, k: int) -> List[Review]:
+        """the k most recent reviews, newest first"""
+        return list(islice(reversed(self.__reviews), k))
 
     @property
     def shelve(self):
@@ -16,14 +16,13 @@ user_blueprint = Blueprint(
 )
 
 NUMBER_OF_RECENT_REVIEWS = 4
+# books of each reading list shown on the profile, the rest is on the pages of the list
+NUMBER_OF_BOOKS_PER_LIST = 1
 
 
 def get_recent_reviews(user: User):
-    results: List[dict] = []
-
-    reviews = sorted(user.reviews, key=lambda x: x.timestamp, reverse=True)
-    reviews = reviews[:NUMBER_OF_RECENT_REVIEWS] if len(reviews) > NUMBER_OF_RECENT_REVIEWS else reviews
-    results = [{
+    reviews = repo.repo_instance.get_recent_reviews_for_user(user, NUMBER_OF_RECENT_REVIEWS)
+    results: List[dict] = [{
         'book': book_services.book_to_dict(review.book),
         'review': book_services.review_to_dict(review),
         'authors': ', '.join(map(lambda a: a.full_name, review.book.authors))
@@ -39,7 +38,7 @@ def get_profile():
         return redirect(url_for('home_bp.error'))
 
     recent_reviews = get_recent_reviews(user)
-    shelve_dict = book_services.shelve_to_dict(user.shelve)
+    shelve_dict = book_services.shelve_to_dict(user.shelve, NUMBER_OF_BOOKS_PER_LIST, repo.repo_instance)
     form = BookAndListForm()
 
     return render_template(
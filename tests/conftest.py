@@ -42,7 +42,7 @@ class AuthenticationManager:
         )
 
     def logout(self):
-        return self.__client.get('/auth/logout')
+        return self.__client.get('/authentication/logout')
 
 
 @pytest.fixture
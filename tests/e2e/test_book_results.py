@@ -1,5 +1,12 @@
+from urllib.parse import urlparse, parse_qs
+
 import pytest
 
+import library.adapters.repository as repo
+from library import create_app
+from library.books import services as book_services
+from utils import get_project_root
+
 
 class TestBookResults:
     def test_single_book_result(self, client):
@@ -14,6 +21,88 @@ class TestBookResults:
         assert b'2021-06-12' in response.data
         # TODO inventory detail
 
+    def test_single_book_is_cached_until_reviewed(self, client, auth, monkeypatch):
+        assert client.get('/book?id=18955715').status_code == 200
+        # popular pages are served without the repository
+        monkeypatch.setattr(repo.repo_instance, 'get_book', None)
+        monkeypatch.setattr(repo.repo_instance, 'get_reviews_for_book', None)
+        response = client.get('/book?id=18955715')
+        assert b'Gray-man' in response.data
+        assert b'2021-06-12' in response.data
+
+        monkeypatch.undo()
+        auth.login()
+        client.post('/book/review', data={'book_id': 18955715, 'rating': 5, 'review': 'worth a second read'})
+        response = client.get('/book?id=18955715')
+        assert b'worth a second read' in response.data
+        # the form is only for users logged in, it is not part of the cached page
+        assert b'Add to a reading list' in response.data
+
+    def test_single_book_shows_one_page_of_reviews(self, client, monkeypatch):
+        monkeypatch.setattr('library.books.book.REVIEWS_PER_PAGE', 3)
+        book = repo.repo_instance.get_book(18955715)
+        reviews = repo.repo_instance.get_reviews_for_book(book)
+        newest = sorted(reviews, key=lambda review: review.timestamp, reverse=True)
+        response = client.get('/book?id=18955715')
+        assert newest[0].review_text.encode() in response.data
+        assert newest[3].review_text.encode() not in response.data
+        assert b'reviews_page=2' in response.data
+
+        response = client.get('/book?id=18955715&reviews_page=2')
+        assert newest[3].review_text.encode() in response.data
+        assert newest[0].review_text.encode() not in response.data
+
+        highest = max(reviews, key=lambda review: (review.rating, review.timestamp))
+        response = client.get('/book?id=18955715&sort=rating&reviews_page=1')
+        assert highest.review_text.encode() in response.data
+        # unknown orders and pages past the end fall back to ones that exist
+        assert client.get('/book?id=18955715&sort=nope&reviews_page=99').status_code == 200
+
+    def test_single_book_not_modified(self, client, auth):
+        response = client.get('/book?id=18955715')
+        etag = response.headers['ETag']
+        response = client.get('/book?id=18955715', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
+        auth.login()
+        # logged in users get forms with CSRF tokens, their pages are not validated
+        assert 'ETag' not in client.get('/book?id=18955715').headers
+        client.post('/book/review', data={'book_id': 18955715, 'rating': 5, 'review': 'worth a second read'})
+        auth.logout()
+        response = client.get('/book?id=18955715', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_reading_list_not_modified(self, client, auth):
+        user = repo.repo_instance.get_user('jreede0')
+        reading_list = [reading_list for reading_list in user.shelve.reading_lists if reading_list.name == 'nulla'][0]
+        url = '/reading_list?id=%d' % reading_list.uid
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+        reading_list.is_public = False
+        # a private list is not validated for those who cannot see it
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 302
+        reading_list.is_public = True
+
+        auth.login()
+        client.post('/process-shelve', data={'name_list': reading_list.uid, 'book_id': 18955715, 'method': 'add',
+                                              'original_url': url})
+        auth.logout()
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert b'Gray-man' in response.data
+
+    @pytest.mark.parametrize('page_cache', ['memory', 'shared'])
+    def test_workers_agree_on_tags(self, tmp_path, page_cache):
+        config = {'TESTING': True, 'TEST_DATA_PATH': get_project_root() / 'tests' / 'data', 'REPOSITORY': 'memory',
+                  'PAGE_CACHE': page_cache, 'PAGE_CACHE_PATH': tmp_path / 'pages.cache'}
+        etag = create_app(config).test_client().get('/book?id=18955715').headers['ETag']
+        # a worker started on the same data later on
+        response = create_app(config).test_client().get('/book?id=18955715', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
     def test_book_result_list(self, client):
         response = client.get('/search_books_result?book_ids=17405342,18711343,1')
         assert response.status_code == 200
@@ -23,24 +112,64 @@ class TestBookResults:
         # second book
         assert b'Takashi Murakami'
 
-    def test_search_by_title(self, client):
+    def test_book_result_list_not_modified(self, client):
+        url = '/search_books_result?book_ids=17405342,18711343'
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+        assert client.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+        # another list, or the same list once the catalog changed, is a different page
+        assert client.get('/search_books_result?book_ids=17405342', headers={'If-None-Match': etag}).status_code == 200
+        assert client.get(url + '&page=2', headers={'If-None-Match': etag}).status_code == 200
+        repo.repo_instance.get_book(17405342).num_pages = 500
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
 
-        response = client.get('/process_search_book?method=Title&param=seiyuu')
+    def search(self, client, query_string):
+        """submit a search and return the ids behind the result cursor it redirects to"""
+        response = client.get('/process_search_book?' + query_string)
+        location = urlparse(response.headers['Location'])
+        assert location.path == '/search_books_result'
+        cursor = parse_qs(location.query)['cursor'][0]
+        return list(book_services.get_book_ids_for_cursor(cursor, repo.repo_instance))
 
-        assert response.headers['Location'] == 'http://localhost/search_books_result?book_ids=17405342&page=1'
+    def test_search_by_title(self, client):
+        assert self.search(client, 'method=Title&param=seiyuu') == [17405342]
 
     def test_search_by_author(self, client):
-        response = client.get('/process_search_book?method=Author&param=Maki%20Minami')
-        assert response.headers['Location'] == 'http://localhost/search_books_result?book_ids=17405342&page=1'
+        assert self.search(client, 'method=Author&param=Maki%20Minami') == [17405342]
 
     def test_search_by_publisher(self, client):
-        response = client.get('/process_search_book?method=Publisher&param=Hakusensha')
-        assert response.headers['Location'] == 'http://localhost/search_books_result?book_ids=17405342&page=1'
+        assert self.search(client, 'method=Publisher&param=Hakusensha') == [17405342]
 
     def test_search_by_year(self, client):
-        response = client.get('/process_search_book?method=Release Year&param=2013')
-        assert response.headers['Location'] == 'http://localhost/search_books_result?book_ids=17405342&page=1'
+        assert self.search(client, 'method=Release Year&param=2013') == [17405342]
 
     def test_search_by_since_year(self, client):
-        response = client.get('/process_search_book?method=Year since&param=2011')
-        assert response.headers['Location'] == 'http://localhost/search_books_result?book_ids=17405342%2C18711343&page=1'
+        assert self.search(client, 'method=Year since&param=2011') == [17405342, 18711343]
+
+    def test_search_by_keywords(self, client):
+        assert self.search(client, 'method=Keywords&param=seiyuu&year_from=2010&ebook=false') == [17405342]
+
+    def test_search_by_unknown_method(self, client):
+        response = client.get('/process_search_book?method=Colour&param=red')
+        assert response.status_code == 404
+
+    def test_book_result_list_for_cursor(self, client):
+        response = client.get('/process_search_book?method=Year since&param=2006')
+        response = client.get(response.headers['Location'].replace('page=1', 'page=2&bpp=2'))
+        assert response.status_code == 200
+        assert b'Found 4 books' in response.data
+        # third and fourth results in catalog order
+        assert b'id=18711343' in response.data
+        assert b'The Thing: Idol of Millions' in response.data
+        assert b'Seiyuu-ka! 12' not in response.data
+
+    def test_book_result_list_recomputes_evicted_cursor(self, client):
+        response = client.get('/process_search_book?method=Title&param=seiyuu')
+        book_services.get_search_results(repo.repo_instance).clear()
+        response = client.get(response.headers['Location'])
+        assert response.status_code == 200
+        assert b'Seiyuu-ka! 12' in response.data
+
+    def test_book_result_list_for_invalid_cursor(self, client):
+        response = client.get('/search_books_result?cursor=not-a-cursor')
+        assert response.status_code == 404
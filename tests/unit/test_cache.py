@@ -0,0 +1,124 @@
+import pytest
+
+from library.cache import LRUCache, MemoryStore, SqliteStore, VersionedCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_evicts_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_cache_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = LRUCache(max_size=2, ttl=10, clock=clock)
+    cache.put('a', 1)
+    clock.now = 9.9
+    assert cache.get('a') == 1
+    clock.now = 10
+    assert cache.get('a') is None
+    assert cache.get('a', 'default') == 'default'
+
+
+def test_cache_can_delete_and_clear_entries():
+    cache = LRUCache()
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.delete('a')
+    assert 'a' not in cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStore(max_size=2)
+    return SqliteStore(tmp_path / 'pages.cache', max_size=2)
+
+
+def test_versioned_cache_computes_once_per_version(store):
+    cache = VersionedCache(store)
+    computed = []
+
+    def compute(value):
+        computed.append(value)
+        return value
+
+    assert cache.get(1, lambda: compute('a')) == 'a'
+    assert cache.get(1, lambda: compute('b')) == 'a'
+    cache.bump(1)
+    assert cache.get(1, lambda: compute('b')) == 'b'
+    assert computed == ['a', 'b']
+    assert store.get((1, 0)) is None
+
+
+def test_value_computed_before_a_bump_is_not_used_after_it(store):
+    cache = VersionedCache(store)
+
+    def compute():
+        # the object changes while its value is computed
+        cache.bump(1)
+        return 'stale'
+
+    assert cache.get(1, compute) == 'stale'
+    assert cache.get(1, lambda: 'fresh') == 'fresh'
+
+
+def test_versioned_cache_tags(store):
+    cache = VersionedCache(store)
+    tag = cache.tag(1)
+    assert cache.tag(1) == tag
+    assert cache.tag(2) != tag
+    cache.bump(1)
+    assert cache.tag(1) != tag
+    # processes sharing the store agree on the tags, a restart clears it and starts another generation
+    assert VersionedCache(store).tag(1) == cache.tag(1)
+    tag = cache.tag(1)
+    store.clear()
+    assert cache.tag(1) != tag
+
+
+def test_store_evicts_values_but_keeps_versions(store):
+    store.bump('a')
+    for key in range(3):
+        store.put(key, str(key))
+    assert store.get(0) is None
+    assert [store.get(1), store.get(2)] == ['1', '2']
+    store.clear()
+    assert store.get(2) is None
+    assert store.version('a') == 1
+    assert store.version('b') == 0
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    SqliteStore(tmp_path / 'pages.cache').put((1, 0), ['page'])
+    other = SqliteStore(tmp_path / 'pages.cache')
+    other.bump(1)
+    assert other.get((1, 0)) == ['page']
+    assert SqliteStore(tmp_path / 'pages.cache').version(1) == 1
+    assert VersionedCache(other).tag(1) == VersionedCache(SqliteStore(tmp_path / 'pages.cache')).tag(1)
+
+
+def test_versioned_cache_keeps_variants_apart(store):
+    cache = VersionedCache(store)
+    assert cache.get(1, lambda: 'page 1') == 'page 1'
+    assert cache.get(1, lambda: 'page 2', variant=2) == 'page 2'
+    assert cache.get(1, lambda: 'other') == 'page 1'
+    cache.bump(1)
+    assert cache.get(1, lambda: 'new page 2', variant=2) == 'new page 2'
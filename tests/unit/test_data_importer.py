@@ -0,0 +1,48 @@
+import shutil
+
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from library.adapters.data_importer import hash_passwords, load_books_and_authors, load_users
+from library.adapters.memory_repository import MemoryRepository
+
+from tests.conftest import TEST_DATA_PATH
+
+
+def test_hash_passwords_keeps_order():
+    passwords = ['password%d' % i for i in range(10)]
+    # two workers, even on a single core machine
+    hashes = hash_passwords(passwords, workers=2)
+    assert len(hashes) == len(passwords)
+    assert all(check_password_hash(hashed, password) for hashed, password in zip(hashes, passwords))
+
+
+def test_hash_passwords_of_few_passwords():
+    hashes = hash_passwords(['Gk8thq'])
+    assert check_password_hash(hashes[0], 'Gk8thq')
+    assert hash_passwords([]) == []
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    data_path = tmp_path / 'data'
+    shutil.copytree(TEST_DATA_PATH, data_path)
+    return data_path
+
+
+def test_load_users_accepts_hashed_passwords(data_path):
+    password_hash = generate_password_hash('Gk8thq')
+    (data_path / 'users.csv').write_text(
+        'id,username,password,pages_read,books_read,password_hashed\n'
+        '1,jreede0,%s,666,13340336 17405342,true\n'
+        '2,vsneaker1,fEpOeb5z3Dl,538,17405342,false\n'
+        '3,dstoneham2,Jm5Jq9W,12,18955715\n' % password_hash)
+    repo = MemoryRepository()
+    load_books_and_authors(data_path, repo, False)
+
+    users = load_users(data_path, repo, False)
+    assert [user.user_name for user in users.values()] == ['jreede0', 'vsneaker1', 'dstoneham2']
+    assert users[1].password == password_hash
+    assert check_password_hash(users[2].password, 'fEpOeb5z3Dl')
+    assert check_password_hash(users[3].password, 'Jm5Jq9W')
+    assert [book.book_id for book in users[1].read_books] == [13340336, 17405342]
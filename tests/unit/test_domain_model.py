@@ -1,9 +1,13 @@
+import gc
+import pickle
+from datetime import datetime
 from pathlib import Path
 import pytest
 
 from utils import get_project_root
 
-from library.domain.model import Publisher, Author, Book, Review, User, BooksInventory, Shelve, ReadingList
+from library.domain.model import Publisher, Author, Book, Review, User, BooksInventory, Shelve, ReadingList, \
+    OrderedSet, make_review
 from library.adapters.jsondatareader import BooksJSONReader
 
 
@@ -406,6 +410,17 @@ class TestUser:
         assert str(user.reviews[1].review_text) == "This book was ok"
         assert user.reviews[1].rating == 2
 
+    def test_user_reviews_are_kept_in_time_order(self):
+        book = Book(874658, "Harry Potter")
+        user = User("Martin", "pw12345")
+        reviews = [Review(book, "Review %d" % day, 3, datetime(2021, 6, day)) for day in (3, 1, 4, 2)]
+        for review in reviews:
+            user.add_review(review)
+
+        assert [review.timestamp.day for review in user.reviews] == [1, 2, 3, 4]
+        assert [review.timestamp.day for review in user.get_recent_reviews(2)] == [4, 3]
+        assert len(user.get_recent_reviews(10)) == 4
+
     def test_passwords(self):
         user1 = User('  Shyamli   ', 'pw12345')
         user2 = User('Martin', 'p90')
@@ -584,5 +599,87 @@ class TestShelves:
         shelve.remove_reading_list(list1)
         assert list1 not in shelve.reading_lists
 
-
-
+    def test_reading_list_books(self):
+        shelve = Shelve()
+        shelve.post_init()
+        reading_list = ReadingList("hello", shelve)
+        books = [Book(book_id, 'Book %d' % book_id) for book_id in range(5)]
+        for book in books + books[:2]:
+            reading_list.add_book(book)
+        reading_list.remove_book(books[2])
+        reading_list.remove_book(books[2])
+
+        assert len(reading_list) == 4
+        assert books[1] in reading_list and books[2] not in reading_list
+        # last in first out, without duplicates
+        assert reading_list.books == [books[4], books[3], books[1], books[0]]
+        assert next(iter(reading_list.books)) == books[4]
+        assert reading_list.books[1:3] == [books[3], books[1]]
+        assert list(reversed(reading_list.books)) == [books[0], books[1], books[3], books[4]]
+
+
+class TestOrderedSet:
+
+    def test_keeps_insertion_order(self):
+        items = OrderedSet([3, 1, 2, 1])
+        items.add(0)
+        items.add(3)
+        items.remove(1)
+        items.discard(5)
+
+        assert items == [3, 2, 0]
+        assert 2 in items and 1 not in items
+        assert len(items) == 3
+        assert repr(items) == '[3, 2, 0]'
+        assert items[1:] == [2, 0]
+        assert items[::2] == [3, 0]
+        assert items[::-1] == [0, 2, 3]
+        with pytest.raises(TypeError):
+            items[0]
+        with pytest.raises(KeyError):
+            items.remove(1)
+
+
+class TestCompactState:
+
+    def test_pickle_round_trip(self):
+        user = User('dave', '123456789')
+        book = Book(1, 'Book')
+        book.add_author(Author(2, 'Author'))
+        book.publisher = Publisher('Publisher')
+        book.average_rating = 3.5
+        review = make_review('Good', 4, user, book)
+        user.shelve.read_list.add_book(book)
+
+        user_copy = pickle.loads(pickle.dumps(user))
+        book_copy, = user_copy.read_books
+        assert book_copy == book
+        assert book_copy.authors == book.authors
+        assert book_copy.publisher == book.publisher
+        assert book_copy.average_rating == 3.5
+        assert book_copy.reviews == [review]
+        assert book_copy.reviews[0].user is user_copy
+        assert user_copy.shelve.read_list.books == [book_copy]
+        assert user_copy.shelve.user is user_copy
+
+    def test_pickle_coauthors(self):
+        book = Book(1, 'Book')
+        book.add_author(Author(1, 'Author 1'))
+        book.add_author(Author(2, 'Author 2'))
+        book.authors[0].add_coauthor(book.authors[1])
+
+        # the authors refer to each other, each one is hashed while the other is read
+        first, second = pickle.loads(pickle.dumps(book)).authors
+        assert first.coauthors == [second]
+        assert second.coauthors == [first]
+
+    def test_objects_have_no_dict(self):
+        user = User('dave', '123456789')
+        book = Book(1, 'Book')
+        book.add_author(Author(2, 'Author'))
+        make_review('Good', 4, user, book)
+
+        for obj in (user, book, book.authors[0], book.reviews[0], user.shelve, *user.shelve.reading_lists):
+            assert not any(isinstance(referent, dict) for referent in gc.get_referents(obj))
+        book_copy = pickle.loads(pickle.dumps(book))
+        assert not any(isinstance(referent, dict) for referent in gc.get_referents(book_copy))
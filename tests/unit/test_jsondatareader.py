@@ -0,0 +1,100 @@
+import json
+
+from library.adapters import jsondatareader
+from library.adapters.jsondatareader import BooksJSONReader, iter_json_lines, json_line_shards
+from utils import get_project_root
+
+from tests.conftest import TEST_DATA_PATH
+
+
+def write_json_lines(path, objects):
+    path.write_text('\n'.join(json.dumps(json_object) for json_object in objects) + '\n\n', encoding='utf-8')
+
+
+def test_iter_json_lines_keeps_only_the_given_fields(tmp_path):
+    path = tmp_path / 'books.json'
+    write_json_lines(path, [{'book_id': '1', 'similar_books': ['2', '3']}, {'book_id': '2', 'popular_shelves': []}])
+
+    assert list(iter_json_lines(path, ('book_id',))) == [{'book_id': '1'}, {'book_id': '2'}]
+    assert list(iter_json_lines(path))[0] == {'book_id': '1', 'similar_books': ['2', '3']}
+
+
+def test_iter_json_lines_reports_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsondatareader, 'PROGRESS_INTERVAL', 2)
+    path = tmp_path / 'authors.json'
+    write_json_lines(path, [{'author_id': str(author_id)} for author_id in range(5)])
+    reports = []
+
+    lines = iter_json_lines(path, progress=lambda *report: reports.append(report))
+    assert next(lines) == {'author_id': '0'}
+    # nothing is read ahead of the line being returned
+    assert reports == []
+    assert len(list(lines)) == 4
+    assert [report[1] for report in reports] == [2, 4, 6]
+    assert reports[-1] == (str(path), 6, path.stat().st_size)
+
+
+def test_reader_streams_the_dumps():
+    reports = []
+    reader = BooksJSONReader(TEST_DATA_PATH / 'comic_books_excerpt.json', TEST_DATA_PATH / 'book_authors_excerpt.json',
+                             progress=lambda *report: reports.append(report))
+    reader.read_json_files()
+
+    assert [book.book_id for book in reader.dataset_of_books] == [17405342, 13340336, 18711343, 2168737, 18955715]
+    book = reader.dataset_of_books[2]
+    assert [author.unique_id for author in book.authors] == [6869276, 7359735, 6384773]
+    assert book.publisher.name == 'Shi Bao Wen Hua Chu Ban Qi Ye Gu Fen You Xian Gong Si'
+    assert len(reader.dataset_of_authors) == 10
+    # each author of the book knows the ones before
+    assert book.authors[2].coauthors == [book.authors[0], book.authors[1]]
+    assert not book.authors[0].check_if_this_author_coauthored_with(book.authors[2])
+    assert [report[0] for report in reports] == [str(TEST_DATA_PATH / 'book_authors_excerpt.json'),
+                                                 str(TEST_DATA_PATH / 'comic_books_excerpt.json')]
+
+
+def test_shards_start_at_lines(tmp_path):
+    path = tmp_path / 'authors.json'
+    write_json_lines(path, [{'author_id': str(author_id)} for author_id in range(50)])
+    shards = json_line_shards(path, 7)
+    data = path.read_bytes()
+
+    assert shards[0][0] == 0
+    assert shards[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(shards, shards[1:]))
+    assert all(data[start - 1:start] == b'\n' for start, _ in shards[1:])
+    assert [json_object for start, end in shards for json_object in iter_json_lines(path, start=start, end=end)] == \
+        list(iter_json_lines(path))
+
+
+def book_graph(reader):
+    """everything the reader builds, with shared objects by identity"""
+    publishers = list(reader.dataset_of_publishers)
+    authors = list(reader.dataset_of_authors)
+    return (
+        [(publisher.name, ) for publisher in publishers],
+        [(author.unique_id, author.full_name, author.average_rating, author.ratings_count,
+          [authors.index(coauthor) for coauthor in author.coauthors]) for author in authors],
+        [(book.book_id, book.title, book.description, book.ebook, book.num_pages, book.release_year,
+          book.average_rating, book.ratings_count, publishers.index(book.publisher),
+          [authors.index(author) for author in book.authors]) for book in reader.dataset_of_books],
+    )
+
+
+def test_parallel_reader_matches_serial_reader(monkeypatch):
+    data_path = get_project_root() / 'library' / 'adapters' / 'data'
+    books_file_name = data_path / 'comic_books_excerpt.json'
+    authors_file_name = data_path / 'book_authors_excerpt.json'
+    serial = BooksJSONReader(books_file_name, authors_file_name)
+    serial.read_json_files()
+
+    monkeypatch.setattr(jsondatareader, 'PARALLEL_PARSE_MIN_BYTES', 0)
+    # more shards than are parsed at a time
+    monkeypatch.setattr(jsondatareader, 'SHARD_MAX_BYTES', books_file_name.stat().st_size // 10)
+    reports = []
+    parallel = BooksJSONReader(books_file_name, authors_file_name, lambda *report: reports.append(report), workers=2)
+    parallel.read_json_files()
+
+    assert book_graph(parallel) == book_graph(serial)
+    # one report per shard, the last one for the whole file
+    assert len(reports) > 2 * jsondatareader.SHARDS_IN_FLIGHT_PER_WORKER
+    assert reports[-1] == (str(books_file_name), 20, books_file_name.stat().st_size)
@@ -2,7 +2,7 @@ import datetime
 
 import pytest
 
-from library.adapters.repository import RepositoryException
+from library.adapters.repository import RepositoryException, REVIEWS_NEWEST_FIRST, REVIEWS_HIGHEST_RATING_FIRST
 from library.domain.model import User, Author, Publisher, Book, Review
 
 
@@ -20,7 +20,7 @@ def test_repository_can_retrieve_a_user(in_memory_repo):
     assert user == User('jreede0', 'Gk8thq')
     assert user.pages_read == 1239
     assert len(user.read_books) == 3
-    assert user.read_books[0].book_id == 13340336
+    assert next(iter(user.read_books)).book_id == 13340336
 
 
 def test_repository_does_not_retrieve_a_non_existent_user(in_memory_repo):
@@ -28,6 +28,14 @@ def test_repository_does_not_retrieve_a_non_existent_user(in_memory_repo):
     assert user is None
 
 
+def test_repository_retrieves_a_user_regardless_of_case(in_memory_repo):
+    user = User('Dave', '123456789')
+    in_memory_repo.add_user(user)
+
+    assert in_memory_repo.get_user('DAVE') is user
+    assert in_memory_repo.get_user('jReede0') is in_memory_repo.get_user('jreede0')
+
+
 #   author section
 def test_repository_can_add_a_author(in_memory_repo):
     author = Author(123, 'dave')
@@ -122,6 +130,20 @@ def test_repository_can_retrieve_books_after_year(in_memory_repo):
     assert books[0].title == "Seiyuu-ka! 12" or books[1].title == "Seiyuu-ka! 12"
 
 
+def test_repository_can_retrieve_books_in_year_range(in_memory_repo):
+    # books in test data, in catalog order, were released in 2013, 2006, 2011, 2006 and N/A
+    books = in_memory_repo.get_books_in_year_range(2006, 2011)
+    assert [book.book_id for book in books] == [13340336, 18711343, 2168737]
+
+    books = in_memory_repo.get_books_in_year_range(None, 2006)
+    assert [book.book_id for book in books] == [13340336, 2168737, 18955715]
+
+    books = in_memory_repo.get_books_in_year_range(2011, None)
+    assert [book.book_id for book in books] == [17405342, 18711343]
+
+    assert in_memory_repo.get_books_in_year_range(2007, 2010) == []
+
+
 def test_repository_can_get_books_by_ids(in_memory_repo):
     books = in_memory_repo.get_books_by_id([13340336, 2168737])
 
@@ -163,6 +185,19 @@ def test_repository_can_add_a_review(in_memory_repo):
     assert review in in_memory_repo.get_reviews_for_book(book)
 
 
+def test_repository_can_retrieve_recent_reviews_for_user(in_memory_repo):
+    user = in_memory_repo.get_user('jreede0')
+    book = in_memory_repo.get_book(13340336)
+    review = Review(book, "Read it again", 4, timestamp=datetime.datetime(2030, 1, 1))
+    user.add_review(review)
+    in_memory_repo.add_review(review, user)
+
+    recent_reviews = in_memory_repo.get_recent_reviews_for_user(user, 2)
+    assert recent_reviews[0] is review
+    assert len(recent_reviews) == min(2, len(user.reviews))
+    assert recent_reviews == sorted(user.reviews, key=lambda review: review.timestamp, reverse=True)[:2]
+
+
 def test_repository_does_not_add_a_review_without_a_user(in_memory_repo):
     book = in_memory_repo.get_books_by_id([13340336])[0]
     review = Review(book, "Trump's onto it!", 3)
@@ -198,6 +233,47 @@ def test_repository_can_retrieve_reviews(in_memory_repo):
     assert review == in_memory_repo.get_reviews_for_book(book)[2]
 
 
+def test_repository_retrieves_pages_of_reviews_for_book(in_memory_repo):
+    book = in_memory_repo.get_book(18955715)
+    reviews = in_memory_repo.get_reviews_for_book(book)
+    assert in_memory_repo.get_number_of_reviews_for_book(book) == 4
+    newest = sorted(reviews, key=lambda review: review.timestamp, reverse=True)
+    assert in_memory_repo.get_reviews_for_book(book, REVIEWS_NEWEST_FIRST) == newest
+    assert in_memory_repo.get_reviews_for_book(book, REVIEWS_NEWEST_FIRST, 1, 2) == newest[1:3]
+    assert in_memory_repo.get_reviews_for_book(book, REVIEWS_NEWEST_FIRST, 4, 2) == []
+
+    user = in_memory_repo.get_user('jreede0')
+    review = Review(book, 'the best one', 5)
+    user.add_review(review)
+    in_memory_repo.add_review(review, user)
+    assert in_memory_repo.get_reviews_for_book(book, REVIEWS_NEWEST_FIRST, 0, 1) == [review]
+    by_rating = in_memory_repo.get_reviews_for_book(book, REVIEWS_HIGHEST_RATING_FIRST)
+    assert by_rating[0] is review
+    assert [review.rating for review in by_rating] == sorted((review.rating for review in by_rating), reverse=True)
+    assert in_memory_repo.get_number_of_reviews_for_book(book) == 5
+
+
+def test_repository_keeps_pages_of_reviews_for_book_sorted(in_memory_repo):
+    book = in_memory_repo.get_book(18955715)
+    user = in_memory_repo.get_user('jreede0')
+    assert len(in_memory_repo.get_reviews_for_book(book, REVIEWS_HIGHEST_RATING_FIRST, 0, 2)) == 2
+    timestamp = datetime.datetime(2000, 1, 1)
+    reviews = [Review(book, 'review %d' % i, 5 - i % 2, timestamp=timestamp) for i in range(4)]
+    for review in reviews:
+        user.add_review(review)
+        in_memory_repo.add_review(review, user)
+
+    # reviews with the same timestamp and rating come newest first, as from the database
+    newest = in_memory_repo.get_reviews_for_book(book, REVIEWS_NEWEST_FIRST)
+    assert newest == sorted(newest, key=lambda review: review.timestamp, reverse=True)
+    assert newest[-4:] == reviews[::-1]
+    by_rating = in_memory_repo.get_reviews_for_book(book, REVIEWS_HIGHEST_RATING_FIRST)
+    assert by_rating == sorted(by_rating, key=lambda review: (review.rating, review.timestamp), reverse=True)
+    assert [review for review in by_rating if review.timestamp == timestamp] == reviews[2::-2] + reviews[3::-2]
+    assert in_memory_repo.get_reviews_for_book(book, REVIEWS_HIGHEST_RATING_FIRST, 7, 2) == by_rating[7:9]
+    assert in_memory_repo.get_reviews_for_book(book, REVIEWS_HIGHEST_RATING_FIRST, 9, 2) == []
+
+
 # remove because inventory is not used
 # def test_repository_can_retrieve_book_inventory(in_memory_repo):
 #     inventory = in_memory_repo.get_books_inventory()
@@ -212,3 +288,47 @@ def test_get_author_by_name(in_memory_repo):
     author = in_memory_repo.get_author_by_name(name)
     assert author is not None
     assert author.unique_id == 6869276
+
+
+def test_repository_returns_book_ids_for_author(in_memory_repo):
+    author = in_memory_repo.get_author_by_name("Maki Minami")
+    assert in_memory_repo.get_book_ids_by_author(author) == [17405342]
+    assert in_memory_repo.get_book_ids_by_author(Author(1, 'nobody')) == []
+
+
+def test_repository_indexes_authors_and_publisher_of_added_book(in_memory_repo):
+    author = Author(123, 'dave')
+    publisher = Publisher('publisher_name')
+    in_memory_repo.add_author(author)
+    in_memory_repo.add_publisher(publisher)
+    book = Book(1, 'book_title')
+    book.add_author(author)
+    book.publisher = publisher
+    in_memory_repo.add_book(book)
+
+    assert in_memory_repo.get_author_by_name('dave') is author
+    assert in_memory_repo.get_book_ids_by_author(author) == [1]
+    assert in_memory_repo.get_book_ids_for_publisher(publisher) == [1]
+
+
+def test_repository_can_retrieve_publisher_by_name(in_memory_repo):
+    assert in_memory_repo.get_publisher_by_name("hakusensha") == Publisher("Hakusensha")
+    assert in_memory_repo.get_publisher_by_name("no such publisher") is None
+
+
+@pytest.mark.parametrize(('title', 'book_ids'), (
+        ('seiyuu', [17405342]),
+        ('SEIYUU-KA! 12', [17405342]),
+        ('th', [13340336, 2168737]),
+        ('y', [17405342, 13340336, 18955715]),
+        ('\u661f\u5b88', [18711343]),
+        ('no such title', []),
+))
+def test_repository_can_retrieve_book_ids_by_title(in_memory_repo, title, book_ids):
+    assert in_memory_repo.get_book_ids_by_title(title) == book_ids
+
+
+def test_repository_indexes_title_of_added_book(in_memory_repo):
+    in_memory_repo.add_book(Book(1, 'A Brand New Seiyuu Story'))
+    assert in_memory_repo.get_book_ids_by_title('seiyuu') == [17405342, 1]
+    assert in_memory_repo.get_book_ids_by_title('nd ne') == [1]
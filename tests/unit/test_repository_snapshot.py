@@ -0,0 +1,74 @@
+import os
+import shutil
+
+import pytest
+
+from library.adapters import repository_snapshot
+from library.adapters.repository_snapshot import load_snapshot, save_snapshot, populate_from_snapshot
+from library.domain.model import ReadingList
+
+from tests.conftest import TEST_DATA_PATH
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    data_path = tmp_path / 'data'
+    shutil.copytree(TEST_DATA_PATH, data_path)
+    return data_path
+
+
+def test_snapshot_round_trip(in_memory_repo, data_path, tmp_path):
+    snapshot_path = tmp_path / 'memory.snapshot'
+    next_id = ReadingList._NEXT_ID
+    save_snapshot(in_memory_repo, data_path, snapshot_path)
+    ReadingList._NEXT_ID = 1
+
+    repo = load_snapshot(data_path, snapshot_path)
+    assert ReadingList._NEXT_ID == next_id
+    assert repo.get_number_of_books() == in_memory_repo.get_number_of_books()
+    assert len(repo.get_reviews()) == len(in_memory_repo.get_reviews())
+    assert repo.get_user('jreede0') == in_memory_repo.get_user('jreede0')
+    assert repo.get_book(17405342).title == 'Seiyuu-ka! 12'
+    # indexes come back with the objects
+    assert repo.get_book_ids_by_title('seiyuu') == [17405342]
+    assert repo.get_author_by_name('Maki Minami').unique_id == 791996
+    assert repo.get_books_in_year_range(2011, 2013) == in_memory_repo.get_books_in_year_range(2011, 2013)
+
+
+def test_missing_snapshot_is_not_loaded(data_path, tmp_path):
+    assert load_snapshot(data_path, tmp_path / 'memory.snapshot') is None
+
+
+def test_snapshot_is_stale_once_a_data_file_changes(in_memory_repo, data_path, tmp_path):
+    snapshot_path = tmp_path / 'memory.snapshot'
+    save_snapshot(in_memory_repo, data_path, snapshot_path)
+    stat = (data_path / 'users.csv').stat()
+    os.utime(data_path / 'users.csv', ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert load_snapshot(data_path, snapshot_path) is None
+
+
+def test_snapshot_of_another_version_is_not_loaded(in_memory_repo, data_path, tmp_path, monkeypatch):
+    snapshot_path = tmp_path / 'memory.snapshot'
+    save_snapshot(in_memory_repo, data_path, snapshot_path)
+    monkeypatch.setattr(repository_snapshot, 'SNAPSHOT_VERSION', repository_snapshot.SNAPSHOT_VERSION + 1)
+    assert load_snapshot(data_path, snapshot_path) is None
+
+
+def test_corrupt_snapshot_is_not_loaded(data_path, tmp_path):
+    snapshot_path = tmp_path / 'memory.snapshot'
+    snapshot_path.write_bytes(repository_snapshot.SNAPSHOT_MAGIC + b'not a pickle')
+    assert load_snapshot(data_path, snapshot_path) is None
+
+
+def test_populate_from_snapshot_reuses_the_saved_repository(data_path, tmp_path, monkeypatch):
+    snapshot_path = tmp_path / 'memory.snapshot'
+    repo = populate_from_snapshot(data_path, snapshot_path)
+    assert snapshot_path.exists()
+
+    def populate(data_path, repo, **kwargs):
+        raise AssertionError('populated again')
+
+    monkeypatch.setattr(repository_snapshot, 'populate', populate)
+    reloaded = populate_from_snapshot(data_path, snapshot_path)
+    assert reloaded is not repo
+    assert reloaded.get_number_of_books() == repo.get_number_of_books()
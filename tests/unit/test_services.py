@@ -5,6 +5,7 @@ from library.authentication.services import AuthenticationException
 from library.authentication import services as auth_services
 
 from library.books import services as book_services
+from library.domain.model import Author
 
 
 # test authentication services
@@ -63,7 +64,22 @@ def test_can_get_book(in_memory_repo):
     assert book_dict['average_rating'] == 4.31
     assert book_dict['rating_count'] == 174
     assert book_dict['text_reviews_count'] == 12
-    assert book_dict['authors'] == [{'full_name': "Maki Minami", 'id': 791996}]
+    assert book_dict['authors'] == ({'full_name': "Maki Minami", 'id': 791996}, )
+
+
+def test_book_dict_is_kept_until_the_book_changes(in_memory_repo):
+    book = in_memory_repo.get_book(17405342)
+    book_dict = book_services.book_to_dict(book)
+    assert book_services.book_to_dict(book) is book_dict
+    with pytest.raises(TypeError):
+        book_dict['title'] = 'Seiyuu-ka! 13'
+
+    book.title = 'Seiyuu-ka! 13'
+    assert book_services.book_to_dict(book)['title'] == 'Seiyuu-ka! 13'
+    book.add_author(Author(1, 'Guest Author'))
+    assert len(book_services.book_to_dict(book)['authors']) == 2
+    book.average_rating = 4.5
+    assert book_services.get_book(17405342, in_memory_repo)['average_rating'] == 4.5
 
 
 def test_cannot_get_book_with_non_existent_id(in_memory_repo):
@@ -188,3 +204,50 @@ def test_cannot_add_review_by_unknown_user(in_memory_repo):
         book_services.add_review(book_id, 5, review_text, user_name, in_memory_repo)
 
 
+def test_search_books_ranks_title_matches_first(in_memory_repo):
+    # "seiyuu" is in the title and description of 17405342 and nowhere else
+    assert book_services.search_books('seiyuu', in_memory_repo) == [17405342]
+    # "marvel" is the publisher of 2168737 and only mentioned in its description
+    assert book_services.search_books('Marvel', in_memory_repo)[0] == 2168737
+
+
+def test_search_books_matches_any_field(in_memory_repo):
+    book_ids = book_services.search_books('Hakusensha Thing', in_memory_repo)
+    assert sorted(book_ids) == [2168737, 17405342]
+
+
+@pytest.mark.parametrize(('filters', 'book_ids'), (
+        ({'start_year': 2011}, [17405342, 18711343]),
+        ({'start_year': 2006, 'end_year': 2006}, [13340336, 2168737]),
+        ({'ebook': True}, [18955715]),
+        ({'min_rating': 4.4}, [13340336, 18955715]),
+        ({'ebook': False, 'min_rating': 4.4}, [13340336]),
+))
+def test_search_books_with_filters_only(in_memory_repo, filters, book_ids):
+    assert book_services.search_books('', in_memory_repo, **filters) == book_ids
+
+
+def test_search_books_returns_at_most_k_results(in_memory_repo):
+    assert len(book_services.search_books('', in_memory_repo, k=2)) == 2
+
+
+def test_search_index_is_rebuilt_once_a_book_changes(in_memory_repo):
+    assert book_services.search_books('seiyuu', in_memory_repo) == [17405342]
+    in_memory_repo.get_book(18711343).title = 'Seiyuu Tales'
+    assert sorted(book_services.search_books('seiyuu', in_memory_repo)) == [17405342, 18711343]
+
+
+def test_shelve_dict_has_the_last_books_of_each_list(in_memory_repo):
+    shelve = in_memory_repo.get_user('jreede0').shelve
+    reading_list = shelve.reading_lists[0]
+    for book_id in (17405342, 18711343, 2168737):
+        reading_list.add_book(in_memory_repo.get_book(book_id))
+
+    shelve_dict = book_services.shelve_to_dict(shelve, 2)
+    list_dict = shelve_dict['lists'][0]
+    assert [book['id'] for book in list_dict['books']] == [2168737, 18711343]
+    assert list_dict['size'] == len(reading_list)
+    assert all(len(list_dict['books']) <= 2 for list_dict in shelve_dict['lists'])
+    assert len(book_services.reading_list_to_dict(reading_list)['books']) == len(reading_list)
+    # the same through the repository
+    assert book_services.shelve_to_dict(shelve, 2, in_memory_repo) == shelve_dict
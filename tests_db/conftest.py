@@ -1,5 +1,7 @@
+from contextlib import contextmanager
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, clear_mappers
 
 from library import map_model_to_tables, metadata
@@ -10,13 +12,14 @@ TEST_DATA_PATH_DATABASE_FULL = get_project_root() / "library" / "adapters" / "da
 TEST_DATA_PATH_DATABASE_LIMITED = get_project_root() / "tests" / "data"
 
 TEST_DATABASE_URI_IN_MEMORY = 'sqlite://'
-TEST_DATABASE_URI_FILE = 'sqlite:///library-test.db'
+# a file in the temporary directory of the test, formatted with its path
+TEST_DATABASE_URI_FILE = 'sqlite:///%s'
 
 
 @pytest.fixture
-def database_engine():
+def database_engine(tmp_path):
     clear_mappers()
-    engine = create_engine(TEST_DATABASE_URI_FILE)
+    engine = create_engine(TEST_DATABASE_URI_FILE % (tmp_path / 'library-test.db'))
     metadata.create_all(engine)  # Conditionally create database tables.
     for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
         engine.execute(table.delete())
@@ -60,3 +63,75 @@ def empty_session():
     session_factory = sessionmaker(bind=engine, autocommit=False)
     yield session_factory()
     metadata.drop_all(engine)
+
+
+class QueryCounter:
+    """records the SQL statements sent to the database while it is active"""
+
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def assert_max_queries(session_factory):
+    """
+    with assert_max_queries(n): ... fails when the block sends more than n statements to the database
+    of session_factory, the statements are listed in the failure message
+    """
+    engine = session_factory.kw['bind']
+
+    @contextmanager
+    def assert_max_queries_(max_queries: int):
+        counter = QueryCounter()
+        event.listen(engine, 'before_cursor_execute', counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, 'before_cursor_execute', counter)
+        assert counter.count <= max_queries, '%d queries, expected at most %d:\n%s' % (
+            counter.count, max_queries, '\n'.join(counter.statements))
+
+    return assert_max_queries_
+
+
+def full_table_scans(connection, statement, parameters):
+    """the tables EXPLAIN QUERY PLAN reports SQLite reading row by row, rather than through an index"""
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    details = [row[-1] for row in plan]
+    return [detail for detail in details
+            if detail.startswith('SCAN ') and ' INDEX ' not in detail and 'VIRTUAL TABLE' not in detail
+            and not detail.startswith('SCAN sqlite_')]
+
+
+@pytest.fixture
+def assert_no_full_scans(database_engine):
+    """
+    with assert_no_full_scans(): ... fails when a SELECT sent to database_engine by the block has to scan a whole
+    table, the statement and its query plan are given in the failure message
+    """
+
+    @contextmanager
+    def assert_no_full_scans_():
+        counter = QueryCounter()
+        event.listen(database_engine, 'before_cursor_execute', counter)
+        try:
+            yield counter
+        finally:
+            event.remove(database_engine, 'before_cursor_execute', counter)
+        assert counter.count > 0
+        with database_engine.connect() as connection:
+            for statement, parameters in zip(counter.statements, counter.parameters):
+                if statement.lstrip().upper().startswith('SELECT'):
+                    scans = full_table_scans(connection, statement, parameters)
+                    assert not scans, '%s\nscans %s' % (statement, ', '.join(scans))
+
+    return assert_no_full_scans_
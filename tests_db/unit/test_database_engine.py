@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool
+
+from library.adapters.database_engine import create_database_engine
+from library.adapters.database_repository import SqlAlchemyRepository
+from library.adapters.orm import metadata, create_missing_indexes
+
+
+def database_uri(tmp_path):
+    return 'sqlite:///%s' % (tmp_path / 'library.db')
+
+
+def pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql('PRAGMA %s' % name).scalar()
+
+
+def test_pooled_engine_sets_connect_pragmas(tmp_path):
+    engine = create_database_engine(database_uri(tmp_path), pool='queue')
+    assert isinstance(engine.pool, QueuePool)
+    assert pragma(engine, 'journal_mode') == 'wal'
+    # NORMAL
+    assert pragma(engine, 'synchronous') == 1
+    assert pragma(engine, 'cache_size') == -64 * 1024
+    engine.dispose()
+
+
+def test_pooled_engine_reuses_connections(tmp_path):
+    engine = create_database_engine(database_uri(tmp_path), pool='queue')
+    for _ in range(10):
+        pragma(engine, 'user_version')
+    statistics = engine.pool_statistics.as_dict()
+    assert statistics['connects'] == 1
+    assert statistics['checkouts'] == 10
+    assert statistics['checked_out'] == 0
+    engine.dispose()
+
+
+def test_null_pool_engine_connects_for_every_checkout(tmp_path):
+    engine = create_database_engine(database_uri(tmp_path), pool='null')
+    assert isinstance(engine.pool, NullPool)
+    for _ in range(3):
+        pragma(engine, 'user_version')
+    assert engine.pool_statistics.connects == 3
+
+
+def test_singleton_pool_engine_keeps_a_connection_per_thread(tmp_path):
+    engine = create_database_engine(database_uri(tmp_path), pool='singleton')
+    assert isinstance(engine.pool, SingletonThreadPool)
+    pragma(engine, 'user_version')
+    thread = threading.Thread(target=pragma, args=(engine, 'user_version'))
+    thread.start()
+    thread.join()
+    pragma(engine, 'user_version')
+    assert engine.pool_statistics.connects == 2
+    engine.dispose()
+
+
+def test_in_memory_database_is_not_spread_over_a_queue_pool():
+    engine = create_database_engine('sqlite://', pool='queue')
+    assert isinstance(engine.pool, SingletonThreadPool)
+
+
+def test_engine_rejects_unknown_pool(tmp_path):
+    with pytest.raises(ValueError):
+        create_database_engine(database_uri(tmp_path), pool='lake')
+
+
+def test_repository_reports_pool_statistics(tmp_path):
+    engine = create_database_engine(database_uri(tmp_path), pool='queue', pool_size=3)
+    repo = SqlAlchemyRepository(sessionmaker(bind=engine))
+    pragma(engine, 'user_version')
+    statistics = repo.pool_statistics()
+    assert statistics['pool'] == 'QueuePool'
+    assert statistics['size'] == 3
+    assert statistics['connects'] == 1
+    engine.dispose()
+
+
+def test_missing_indexes_are_added_to_existing_tables(tmp_path):
+    engine = create_database_engine(database_uri(tmp_path))
+    metadata.create_all(engine)
+    # the review table as created before its indexes were declared
+    for index_name in ('ix_review_user_id_timestamp', 'ix_review_book_id_timestamp',
+                       'ix_review_book_id_rating_timestamp'):
+        engine.execute('DROP INDEX %s' % index_name)
+    engine.execute('CREATE INDEX ix_review_user_id ON review (user_id)')
+    engine.execute('CREATE INDEX ix_review_book_id ON review (book_id)')
+    metadata.create_all(engine)
+    assert 'ix_review_user_id_timestamp' not in {index['name'] for index in inspect(engine).get_indexes('review')}
+
+    create_missing_indexes(engine)
+    create_missing_indexes(engine)
+    index_names = {index['name'] for index in inspect(engine).get_indexes('review')}
+    assert {'ix_review_user_id_timestamp', 'ix_review_book_id_timestamp',
+            'ix_review_book_id_rating_timestamp'} <= index_names
+    assert not {'ix_review_user_id', 'ix_review_book_id'} & index_names
+    engine.dispose()
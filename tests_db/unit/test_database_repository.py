@@ -1,10 +1,14 @@
 from datetime import date, datetime
 import pytest
+from flask import Flask
+from sqlalchemy import inspect
+from sqlalchemy.orm import sessionmaker
 
 import library.adapters.repository as repo
-from library.adapters.database_repository import SqlAlchemyRepository
+from library.adapters.database_repository import SqlAlchemyRepository, SessionContextManager
 from library.domain.model import User, Author, Publisher, Book, Review
-from library.adapters.repository import RepositoryException
+from library.adapters.repository import RepositoryException, REVIEWS_NEWEST_FIRST, REVIEWS_HIGHEST_RATING_FIRST
+from library.books import services as book_services
 
 
 def test_repository_can_add_a_user(session_factory):
@@ -24,7 +28,7 @@ def test_repository_can_retrieve_a_user(session_factory):
     assert user == User('ftinson0','3XE1blo')
     assert user.pages_read >=612
     assert len(user.read_books) >=3
-    assert user.read_books[0].book_id == 13340336
+    assert next(iter(user.read_books)).book_id == 13340336
 
 
 def test_repository_does_not_retrieve_a_non_existent_user(session_factory):
@@ -190,6 +194,16 @@ def test_repository_can_retrieve_books_after_year(session_factory):
     assert books[0].title == 'Sherlock Holmes: Year One' or books[1].title == 'Sherlock Holmes: Year One'
 
 
+def test_repository_can_retrieve_books_in_year_range(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    books = repo.get_books_in_year_range(2010, 2011)
+    assert all(2010 <= book.release_year <= 2011 for book in books)
+    assert 'Sherlock Holmes: Year One' in [book.title for book in books]
+
+    assert len(repo.get_books_in_year_range(2011, None)) == len(repo.get_books_after_year_inclusive(2011))
+    assert repo.get_books_in_year_range(1900, 1901) == []
+
+
 def test_repository_can_get_books_by_ids(session_factory):
     repo = SqlAlchemyRepository(session_factory)
     books = repo.get_books_by_id([13340336, 2168737])
@@ -214,6 +228,16 @@ def test_repository_returns_an_empty_list_for_non_existent_ids(session_factory):
     assert len(books) == 0
 
 
+def test_repository_get_books_by_ids_keeps_order_past_parameter_limit(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    book_ids = [book.book_id for book in repo.get_books_in_year_range(None, None)]
+    # missing ids padding the request out to several IN queries, with the real ids spread across them
+    id_list = list(range(1, 2500)) + book_ids[::-1] + list(range(2500, 3000)) + book_ids[:1]
+
+    books = repo.get_books_by_id(id_list)
+    assert [book.book_id for book in books] == book_ids[::-1] + book_ids[:1]
+
+
 def test_repository_returns_book_id_for_publisher(session_factory):
     repo = SqlAlchemyRepository(session_factory)
     book_ids = repo.get_book_ids_for_publisher(Publisher("Hakusensha"))
@@ -236,6 +260,17 @@ def test_repository_can_add_a_review(session_factory):
     assert review in repo.get_reviews_for_book(book)
 
 
+def test_repository_can_retrieve_recent_reviews_for_user(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    user = repo.get_user('ftinson0')
+    by_time = sorted(user.reviews, key=lambda review: review.timestamp, reverse=True)
+    assert user.reviews == by_time[::-1]
+
+    recent_reviews = repo.get_recent_reviews_for_user(user, 2)
+    assert [review.timestamp for review in recent_reviews] == [review.timestamp for review in by_time[:2]]
+    assert all(review.book.publisher is not None for review in recent_reviews)
+
+
 def test_repository_does_not_add_a_review_without_a_user(session_factory):
     repo = SqlAlchemyRepository(session_factory)
     book = repo.get_books_by_id([13340336])[0]
@@ -275,6 +310,18 @@ def test_repository_can_retrieve_reviews(session_factory):
     assert review == repo.get_reviews_for_book(book)[0]
 
 
+def test_repository_retrieves_pages_of_reviews_for_book(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    book = repo.get_book(30128855)
+    reviews = repo.get_reviews_for_book(book)
+    assert repo.get_number_of_reviews_for_book(book) == len(reviews)
+    newest = repo.get_reviews_for_book(book, REVIEWS_NEWEST_FIRST)
+    assert [review.timestamp for review in newest] == sorted((review.timestamp for review in reviews), reverse=True)
+    assert repo.get_reviews_for_book(book, REVIEWS_NEWEST_FIRST, 10, 10) == newest[10:]
+    by_rating = repo.get_reviews_for_book(book, REVIEWS_HIGHEST_RATING_FIRST, 0, 5)
+    assert [review.rating for review in by_rating] == sorted((review.rating for review in reviews), reverse=True)[:5]
+
+
 #  remove because inventory is not used
 # def test_repository_can_retrieve_book_inventory(session_factory):
 #     repo = SqlAlchemyRepository(session_factory)
@@ -291,3 +338,112 @@ def test_get_author_by_name(session_factory):
     author = repo.get_author_by_name(name)
     assert author is not None
     assert author.unique_id == 6869276
+
+
+def test_repository_can_retrieve_publisher_by_name(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    assert repo.get_publisher_by_name("hakusensha") == Publisher("Hakusensha")
+    assert repo.get_publisher_by_name("no such publisher") is None
+
+
+@pytest.mark.parametrize('title', ('seiyuu', 'SEIYUU', 'man', 'th', '20th Century Boys, Libro', 'no such title'))
+def test_repository_can_retrieve_book_ids_by_title(session_factory, title):
+    repo = SqlAlchemyRepository(session_factory)
+    expected = sorted(
+        book.book_id for book in session_factory().query(Book).all() if title.lower() in book.title.lower())
+    assert repo.get_book_ids_by_title(title) == expected
+
+
+def test_title_index_follows_book_table(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    assert repo.has_title_fts()
+    repo.add_book(Book(1, 'A Brand New Seiyuu Story'))
+    assert 1 in repo.get_book_ids_by_title('seiyuu')
+
+
+def test_book_page_is_loaded_with_constant_queries(session_factory, assert_max_queries):
+    repo = SqlAlchemyRepository(session_factory)
+    # book with publisher and its authors, the same again for the reviews service, then the reviews and their users
+    with assert_max_queries(6):
+        book = book_services.get_book(30128855, repo)
+        reviews = book_services.get_reviews_for_book(30128855, repo)
+    assert len(book['authors']) > 0
+    assert len(reviews) == 14
+
+
+def test_book_list_page_is_loaded_with_constant_queries(session_factory, assert_max_queries):
+    repo = SqlAlchemyRepository(session_factory)
+    book_ids = [book.book_id for book in repo.get_books_in_year_range(None, None)]
+    repo = SqlAlchemyRepository(session_factory)
+    with assert_max_queries(2):
+        books = book_services.get_books(book_ids, repo)
+    assert [book['id'] for book in books] == book_ids
+    assert all(book['publisher']['name'] for book in books)
+
+
+def test_reading_list_page_is_loaded_with_constant_queries(session_factory, assert_max_queries):
+    repo = SqlAlchemyRepository(session_factory)
+    reading_list_id = max(repo.get_shelves()[0].reading_lists, key=len).uid
+    repo = SqlAlchemyRepository(session_factory)
+    with assert_max_queries(4):
+        reading_list = repo.get_reading_list_by_id(reading_list_id)
+        books = [book_services.book_to_dict(book) for book in reading_list.books]
+        owner = reading_list.shelve.user.user_name
+    assert len(books) > 0
+    assert owner is not None
+
+
+def test_profile_lists_do_not_load_their_books(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    reading_list = max(repo.get_shelves()[0].reading_lists, key=len)
+    books = list(reading_list.books)
+    repo = SqlAlchemyRepository(session_factory)
+    shelve = repo.get_shelves()[0]
+
+    shelve_dict = book_services.shelve_to_dict(shelve, 2, repo)
+    list_dict, = [list_dict for list_dict in shelve_dict['lists'] if list_dict['id'] == reading_list.uid]
+    assert [book['id'] for book in list_dict['books']] == [book.book_id for book in books[:2]]
+    assert list_dict['size'] == len(books)
+    assert all('_ReadingList__books' in inspect(reading_list).unloaded for reading_list in shelve.reading_lists)
+
+
+def test_session_is_scoped_to_the_app_context(empty_session):
+    session_cm = SessionContextManager(sessionmaker(bind=empty_session.get_bind()))
+    outside = session_cm.session()
+    app = Flask(__name__)
+    with app.app_context():
+        inside = session_cm.session()
+        assert inside is not outside
+        assert session_cm.session() is inside
+        session_cm.close_current_session()
+        assert session_cm.session() is not inside
+    assert session_cm.session() is outside
+
+
+def test_book_dict_is_kept_for_the_session(session_factory, assert_max_queries):
+    repo = SqlAlchemyRepository(session_factory)
+    book = repo.get_book(30128855)
+    book_dict = book_services.book_to_dict(book)
+    with assert_max_queries(0):
+        assert book_services.get_book(30128855, repo) is book_dict
+
+    # a book reloaded from the database is serialised again
+    repo.commit()
+    assert book.serialized is None
+    assert book_services.book_to_dict(book) == book_dict
+
+
+def test_search_index_is_kept_until_a_book_is_added(session_factory, assert_max_queries):
+    repo = SqlAlchemyRepository(session_factory)
+    # the version, the books with their publishers, and their authors
+    with assert_max_queries(3):
+        index = book_services.get_search_index(repo)
+    # the commit expires the loaded books, which does not change the catalog
+    user = repo.get_user('ftinson0')
+    review = Review(repo.get_book(13340336), "Trump's onto it!", 3)
+    user.add_review(review)
+    repo.add_review(review, user)
+    assert book_services.get_search_index(repo) is index
+
+    repo.add_book(Book(1, 'book_title'))
+    assert book_services.get_search_index(repo) is not index
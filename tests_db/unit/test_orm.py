@@ -2,11 +2,12 @@ from itertools import permutations
 from typing import List
 
 import pytest, datetime
+from sqlalchemy import inspect
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import with_polymorphic, selectin_polymorphic
 
 from library.domain.model import User, Publisher, Book, Review, make_review, Author, ReadingList, BundledReadingList, \
-    ReadReadingList, Shelve
+    ReadReadingList, Shelve, CompactState
 
 
 def insert_user(empty_session, values=None):
@@ -549,3 +550,15 @@ def test_saving_loading_shelve(empty_session):
     assert shelve.user == user
     # check bundling
     assert shelve.to_read_list.is_bundled_with(shelve.read_list)
+
+
+def test_every_compact_class_is_mapped(empty_session):
+    # they keep __dict__ among their slots for SQLAlchemy, see CompactState
+    classes = CompactState.__subclasses__()
+    while classes:
+        cls = classes.pop()
+        subclasses = cls.__subclasses__()
+        # Reviewed is only mapped through Book and Author
+        if not subclasses:
+            assert inspect(cls).local_table is not None
+        classes.extend(subclasses)
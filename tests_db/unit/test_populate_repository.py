@@ -1,12 +1,23 @@
-from sqlalchemy import select, inspect, false, true
+from sqlalchemy import select, inspect, false, true, create_engine
+from sqlalchemy.orm import clear_mappers, sessionmaker
 
-from library.adapters.orm import metadata
+from library.adapters import repository_populate
+from library.adapters.database_repository import SqlAlchemyRepository
+from library.adapters.orm import metadata, book_title_fts_name, map_model_to_tables
+from library.domain.model import ReadingList
+from tests_db.conftest import TEST_DATABASE_URI_IN_MEMORY, TEST_DATA_PATH_DATABASE_LIMITED
+
+
+def get_model_table_names(inspector):
+    # the title full-text index is kept in a virtual table and its shadow tables, next to the model tables
+    return [name for name in inspector.get_table_names() if not name.startswith(book_title_fts_name)]
 
 
 def test_database_populate_inspect_table_names(database_engine):
     # Get table information
     inspector = inspect(database_engine)
-    assert inspector.get_table_names() == [
+    assert book_title_fts_name in inspector.get_table_names()
+    assert get_model_table_names(inspector) == [
         'author', 'book', 'book_author',
         'bundled_list',
         'publisher',
@@ -22,7 +33,7 @@ def test_database_populate_inspect_table_names(database_engine):
 def test_database_populate_select_all_users(database_engine):
     # Get table information
     inspector = inspect(database_engine)
-    name_of_users_table = inspector.get_table_names()[9]
+    name_of_users_table = get_model_table_names(inspector)[9]
 
     with database_engine.connect() as connection:
         # query for records in table users
@@ -40,7 +51,7 @@ def test_database_populate_select_all_users(database_engine):
 # not sure if publisher names are correct.
 def test_database_populate_select_all_publishers(database_engine):
     inspector = inspect(database_engine)
-    name_of_publisher_table = inspector.get_table_names()[4]
+    name_of_publisher_table = get_model_table_names(inspector)[4]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -63,7 +74,7 @@ def test_database_populate_select_all_publishers(database_engine):
 # needs work
 def test_database_populate_select_all_books(database_engine):
     inspector = inspect(database_engine)
-    name_of_books_table = inspector.get_table_names()[1]
+    name_of_books_table = get_model_table_names(inspector)[1]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -80,7 +91,7 @@ def test_database_populate_select_all_books(database_engine):
 
 def test_database_populate_select_all_reviews(database_engine):
     inspector = inspect(database_engine)
-    name_of_reviews_table = inspector.get_table_names()[7]
+    name_of_reviews_table = get_model_table_names(inspector)[7]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -100,7 +111,7 @@ def test_database_populate_select_all_reviews(database_engine):
 
 def test_database_populate_select_all_shelves(database_engine):
     inspector = inspect(database_engine)
-    name_of_shelves_table = inspector.get_table_names()[8]
+    name_of_shelves_table = get_model_table_names(inspector)[8]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -121,7 +132,7 @@ def test_database_populate_select_all_shelves(database_engine):
 
 def test_database_populate_select_all_reading_lists(database_engine):
     inspector = inspect(database_engine)
-    name_of_reading_list_table = inspector.get_table_names()[5]
+    name_of_reading_list_table = get_model_table_names(inspector)[5]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -140,7 +151,7 @@ def test_database_populate_select_all_reading_lists(database_engine):
 
 def test_database_populate_select_all_author(database_engine):
     inspector = inspect(database_engine)
-    name_of_authors_table = inspector.get_table_names()[0]
+    name_of_authors_table = get_model_table_names(inspector)[0]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -167,7 +178,7 @@ def test_database_populate_select_all_author(database_engine):
 
 def test_database_populate_select_all_book_author(database_engine):
     inspector = inspect(database_engine)
-    name_of_book_author_table = inspector.get_table_names()[2]
+    name_of_book_author_table = get_model_table_names(inspector)[2]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -187,7 +198,7 @@ def test_database_populate_select_all_book_author(database_engine):
 # needs work
 def test_database_populate_select_all_user_books_read(database_engine):
     inspector = inspect(database_engine)
-    name_of_books_table = inspector.get_table_names()[10]
+    name_of_books_table = get_model_table_names(inspector)[10]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -207,7 +218,7 @@ def test_database_populate_select_all_user_books_read(database_engine):
 
 def test_database_populate_select_all_bundled_list(database_engine):
     inspector = inspect(database_engine)
-    name_of_bundled_list = inspector.get_table_names()[3]
+    name_of_bundled_list = get_model_table_names(inspector)[3]
 
     with database_engine.connect() as connection:
         # query for records in table tags
@@ -223,3 +234,33 @@ def test_database_populate_select_all_bundled_list(database_engine):
 
         for value in all_bundled_list[0]:
             assert value > 0
+
+
+def dump_tables(engine):
+    with engine.connect() as connection:
+        return {
+            table.name: sorted((tuple(row) for row in connection.execute(select([table]))), key=repr)
+            for table in metadata.sorted_tables
+        }
+
+
+def populate_new_database(bulk_mode):
+    clear_mappers()
+    ReadingList._NEXT_ID = 1
+    engine = create_engine(TEST_DATABASE_URI_IN_MEMORY)
+    metadata.create_all(engine)
+    map_model_to_tables()
+    repo = SqlAlchemyRepository(sessionmaker(bind=engine))
+    repository_populate.populate(TEST_DATA_PATH_DATABASE_LIMITED, repo, True, bulk_mode)
+    return engine
+
+
+def test_database_bulk_populate_matches_populate():
+    tables = dump_tables(populate_new_database(bulk_mode=False))
+    bulk_tables = dump_tables(populate_new_database(bulk_mode=True))
+
+    # password hashes are salted, compare everything else
+    tables['user'] = [row[:2] + row[3:] for row in tables['user']]
+    bulk_tables['user'] = [row[:2] + row[3:] for row in bulk_tables['user']]
+    assert len(bulk_tables['review']) > 0
+    assert bulk_tables == tables
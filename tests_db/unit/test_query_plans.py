@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from library.adapters.database_repository import SqlAlchemyRepository
+from library.domain.model import Publisher
+
+# every repository lookup on a hot path, each has to be answered through an index
+REPOSITORY_QUERIES = {
+    'get_user': lambda repo: repo.get_user('jreede0'),
+    'get_user_read_books': lambda repo: repo.get_user('jreede0').read_books,
+    'get_user_reviews': lambda repo: repo.get_user('jreede0').reviews,
+    'get_author': lambda repo: repo.get_author(294649),
+    'get_author_by_name': lambda repo: repo.get_author_by_name('Naoki Urasawa'),
+    'get_book': lambda repo: repo.get_book(17405342),
+    'get_books_by_id': lambda repo: repo.get_books_by_id([13340336, 2168737]),
+    'get_books_by_year': lambda repo: repo.get_books_by_year(2013),
+    'get_books_after_year_inclusive': lambda repo: repo.get_books_after_year_inclusive(2011),
+    'get_books_in_year_range': lambda repo: repo.get_books_in_year_range(2010, 2011),
+    'get_book_ids_by_title': lambda repo: repo.get_book_ids_by_title('seiyuu'),
+    'get_book_ids_by_author': lambda repo: repo.get_book_ids_by_author(repo.get_author(294649)),
+    'get_book_ids_for_publisher': lambda repo: repo.get_book_ids_for_publisher(Publisher('Hakusensha')),
+    'get_publisher_by_name': lambda repo: repo.get_publisher_by_name('hakusensha'),
+    'get_reviews_for_book': lambda repo: repo.get_reviews_for_book(repo.get_book(13340336)),
+    'get_newest_reviews_for_book': lambda repo: repo.get_reviews_for_book(repo.get_book(13340336), 'newest', 10, 10),
+    'get_highest_rated_reviews_for_book': lambda repo: repo.get_reviews_for_book(repo.get_book(13340336), 'rating',
+                                                                                 0, 10),
+    'get_number_of_reviews_for_book': lambda repo: repo.get_number_of_reviews_for_book(repo.get_book(13340336)),
+    'get_recent_reviews_for_user': lambda repo: repo.get_recent_reviews_for_user(repo.get_user('jreede0'), 4),
+    'get_reading_list_by_id': lambda repo: repo.get_reading_list_by_id(1),
+    'get_last_books_of_reading_list': lambda repo: repo.get_last_books_of_reading_list(
+        repo.get_user('jreede0').shelve.reading_lists[0], 2),
+    'get_reading_list_size': lambda repo: repo.get_reading_list_size(repo.get_user('jreede0').shelve.reading_lists[0]),
+    'get_user_shelve': lambda repo: repo.get_user('jreede0').shelve,
+}
+
+
+@pytest.mark.parametrize('query', REPOSITORY_QUERIES.values(), ids=REPOSITORY_QUERIES.keys())
+def test_repository_query_uses_indexes(database_engine, assert_no_full_scans, query):
+    repo = SqlAlchemyRepository(sessionmaker(bind=database_engine))
+    with assert_no_full_scans():
+        query(repo)
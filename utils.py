@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Callable, List
 import sys
 
 
@@ -39,5 +39,21 @@ class Checks:
         return isinstance(val, int) and val >= 0
 
 
+def insort_by_key(items: List, item: Any, key: Callable[[Any], Any]):
+    """
+    insert item into items kept sorted by key, after the items with an equal key. bisect only takes a key from
+    Python 3.10 on
+    """
+    item_key = key(item)
+    low, high = 0, len(items)
+    while low < high:
+        middle = (low + high) // 2
+        if item_key < key(items[middle]):
+            high = middle
+        else:
+            low = middle + 1
+    items.insert(low, item)
+
+
 def log(*args, **kwargs):
     print(*args, **kwargs, file=sys.stderr)